@@ -2,6 +2,8 @@ from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
 from .definitions import HBD_SMARTS, HBA_SMARTS
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
 
 def db_init(table_name):
     return (f"""
@@ -9,6 +11,7 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 hbd_count INTEGER DEFAULT 0,
                 hba_count INTEGER DEFAULT 0,
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -17,14 +20,12 @@ def db_init(table_name):
             CREATE INDEX IF NOT EXISTS idx_{table_name}_hba ON {table_name}(hba_count);
     """)
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     try:
+        features = features or MolFeatures(mol, prefilter=False)
         # 预计算供体和受体数量
-        hbd_pattern = Chem.MolFromSmarts(HBD_SMARTS)
-        hba_pattern = Chem.MolFromSmarts(HBA_SMARTS)
-
-        hbd_matches = mol.GetSubstructMatches(hbd_pattern)
-        hba_matches = mol.GetSubstructMatches(hba_pattern)
+        hbd_matches = features.matches(HBD_SMARTS)
+        hba_matches = features.matches(HBA_SMARTS)
 
         hbd_count = len(hbd_matches)
         hba_count = len(hba_matches)
@@ -35,7 +36,9 @@ def get_mol_value(mol: Chem.Mol):
 
         return {
             "hbd_count": hbd_count,
-            "hba_count": hba_count
+            "hba_count": hba_count,
+            # 两种模式的答案原子，按 SMARTS 存 (verify 旧路径按 token 中的 sm 取)
+            "answer_json": dump_answers({HBD_SMARTS: hbd_matches, HBA_SMARTS: hba_matches})
         }
 
     except Exception as e:
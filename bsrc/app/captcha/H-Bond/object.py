@@ -3,12 +3,14 @@ from .func import *
 from .db import *
 from .definitions import HBD_SMARTS, HBA_SMARTS
 from app.captcha.base import BaseCaptcha
+from app.captcha.features import MolFeatures
 from app.captcha.utils import *
 
 
 class HBondCaptcha(BaseCaptcha):
     slug = "h_bond"
     table_name = "h_bond"
+    smarts = (HBD_SMARTS, HBA_SMARTS)
 
     def __init__(self, width, height, runtime=True, mol_path = ""):
         self.width = width
@@ -47,14 +49,14 @@ class HBondCaptcha(BaseCaptcha):
         return db_init(self.table_name)
 
     def generate_img(self) -> dict:
-        return draw_func(self.rdkit_object, width=self.width, height=self.height)
+        return draw_func(self.get_render(), self.image_format)
 
     def generate_answer(self) -> list:
         return hb_generate_answer_coords(
             self.rdkit_object,
-            width=self.width,
-            height=self.height,
-            target_smarts=self.target_smarts
+            atom_coords=self.get_render().atom_coords,
+            target_smarts=self.target_smarts,
+            matches=self.get_answers().get(self.target_smarts)
         )
 
     def generate_read_output(self) -> str:
@@ -68,5 +70,5 @@ class HBondCaptcha(BaseCaptcha):
     def verify(self, answer_data: list, user_input: Any) -> bool:
         return base_verify(user_input=user_input, answer_data=answer_data)
 
-    def get_metadata(self, mol: Chem.Mol) -> bool:
-        return get_mol_value(mol)
\ No newline at end of file
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> bool:
+        return get_mol_value(mol, features)
\ No newline at end of file
@@ -3,6 +3,8 @@ from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
 from .definitions import ACID_GROUPS, BASE_GROUPS
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
 
 
 def db_init(table_name):
@@ -11,6 +13,7 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 best_acid_json TEXT,  
                 best_base_json TEXT, 
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -18,14 +21,13 @@ def db_init(table_name):
     """)
 
 
-def get_best_group(mol, groups_def):
+def get_best_group(features: MolFeatures, groups_def):
     """找到分子中优先级最高的基团"""
     best_p = 999
     best_info = None
 
     for item in groups_def:
-        pattern = Chem.MolFromSmarts(item["smarts"])
-        if mol.HasSubstructMatch(pattern):
+        if features.has_match(item["smarts"]):
             if item["priority"] < best_p:
                 best_p = item["priority"]
                 best_info = item
@@ -33,18 +35,26 @@ def get_best_group(mol, groups_def):
     return best_info
 
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     try:
-        acid_info = get_best_group(mol, ACID_GROUPS)
-        base_info = get_best_group(mol, BASE_GROUPS)
+        features = features or MolFeatures(mol, prefilter=False)
+        acid_info = get_best_group(features, ACID_GROUPS)
+        base_info = get_best_group(features, BASE_GROUPS)
 
         # 只要有酸 或 有碱 就可以入库
         if not acid_info and not base_info:
             return None
 
+        # 酸/碱两种模式的答案原子，按 SMARTS 存
+        answers = {}
+        for info in (acid_info, base_info):
+            if info:
+                answers[info["smarts"]] = features.matches(info["smarts"])
+
         return {
             "best_acid_json": json.dumps(acid_info, ensure_ascii=False) if acid_info else None,
-            "best_base_json": json.dumps(base_info, ensure_ascii=False) if base_info else None
+            "best_base_json": json.dumps(base_info, ensure_ascii=False) if base_info else None,
+            "answer_json": dump_answers(answers)
         }
 
     except Exception as e:
@@ -1,12 +1,15 @@
 import random
 from .db import *
+from .definitions import ACID_GROUPS, BASE_GROUPS
 from app.captcha.base import BaseCaptcha
+from app.captcha.features import MolFeatures
 from app.captcha.utils import *
 
 
 class AcidBaseCaptcha(BaseCaptcha):
     slug = "acid_base"
     table_name = "acid_base"
+    smarts = tuple(item["smarts"] for item in ACID_GROUPS + BASE_GROUPS)
 
     def __init__(self, width, height, runtime=True, mol_path = ""):
         self.width = width
@@ -48,14 +51,14 @@ class AcidBaseCaptcha(BaseCaptcha):
         return db_init(self.table_name)
 
     def generate_img(self) -> dict:
-        return draw_func(self.rdkit_object, width=self.width, height=self.height)
+        return draw_func(self.get_render(), self.image_format)
 
     def generate_answer(self) -> list:
         return generate_answer_coords(
             self.rdkit_object,
-            width=self.width,
-            height=self.height,
-            target_smarts=self.target_smarts
+            atom_coords=self.get_render().atom_coords,
+            target_smarts=self.target_smarts,
+            matches=self.get_answers().get(self.target_smarts)
         )
 
     def generate_read_output(self) -> str:
@@ -69,5 +72,5 @@ class AcidBaseCaptcha(BaseCaptcha):
     def verify(self, answer_data: list, user_input: Any) -> bool:
         return base_verify(user_input=user_input, answer_data=answer_data)
 
-    def get_metadata(self, mol: Chem.Mol) -> bool:
-        return get_mol_value(mol)
\ No newline at end of file
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> bool:
+        return get_mol_value(mol, features)
\ No newline at end of file
@@ -1,6 +1,8 @@
 from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
 
 def db_init(table_name):
     return (f"""
@@ -8,6 +10,7 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 has_aromatic BOOLEAN DEFAULT 0,
                 ring_count INTEGER DEFAULT 0,
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -16,26 +19,24 @@ def db_init(table_name):
     """)
 
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     try:
-        ri = mol.GetRingInfo()
-        atom_rings = ri.AtomRings()
+        features = features or MolFeatures(mol, prefilter=False)
+        atom_rings = features.atom_rings
 
         if not atom_rings:
             return None
 
-        has_aromatic = False
-        for ring in atom_rings:
-            if all(mol.GetAtomWithIdx(idx).GetIsAromatic() for idx in ring):
-                has_aromatic = True
-                break
+        aromatic = features.aromatic
+        aromatic_rings = [list(ring) for ring in atom_rings if aromatic[list(ring)].all()]
 
-        if not has_aromatic:
+        if not aromatic_rings:
             return None
 
         return {
             "has_aromatic": True,
-            "ring_count": len(atom_rings)
+            "ring_count": len(atom_rings),
+            "answer_json": dump_answers({"rings": aromatic_rings})
         }
 
     except Exception as e:
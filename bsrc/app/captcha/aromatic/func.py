@@ -1,22 +1,9 @@
-from app.captcha.utils import base_draw, construct_rdkit
+from app.captcha.utils import construct_rdkit, render_mol, draw_func
 from app.utils.logger import logger
 from rdkit import Chem
-from rdkit.Chem.Draw import rdMolDraw2D
 
 
-def draw_func(mol: Chem.rdchem.Mol, width: int, height: int) -> dict:
-    b64_data= base_draw(mol, width, height)
-
-    return {
-        "img_base64": f"data:image/png;base64,{b64_data}",
-        "size": {
-            "width": width,
-            "height": height
-        }
-    }
-
-
-def generate_answer(mol: Chem.Mol, width: int, height: int) -> list:
+def generate_answer(mol: Chem.Mol, atom_coords: list, rings: list = None) -> list:
     """
     返回所有芳香环的多边形顶点列表
     返回结构示例:
@@ -24,14 +11,14 @@ def generate_answer(mol: Chem.Mol, width: int, height: int) -> list:
       [ (x1, y1), (x2, y2), ... (x6, y6) ],  # 第一个环的顶点
       [ (x1, y1), ... ]                      # 第二个环的顶点
     ]
+    rings: 入库时预计算的芳香环 (原子 idx)，缺省时现算
     """
-    ri = mol.GetRingInfo()
     valid_polygons = []
 
-    d2d = rdMolDraw2D.MolDraw2DCairo(width, height)
-    d2d.DrawMolecule(mol)
+    if rings is None:
+        rings = mol.GetRingInfo().AtomRings()
 
-    for ring_atom_indices in ri.AtomRings():
+    for ring_atom_indices in rings:
         is_aromatic = True
         for idx in ring_atom_indices:
             if not mol.GetAtomWithIdx(idx).GetIsAromatic():
@@ -41,9 +28,7 @@ def generate_answer(mol: Chem.Mol, width: int, height: int) -> list:
         if is_aromatic:
             polygon = []
             for atom_idx in ring_atom_indices:
-
-                p = d2d.GetDrawCoords(atom_idx)
-                polygon.append((p.x, p.y))
+                polygon.append(atom_coords[atom_idx])
 
             valid_polygons.append(polygon)
 
@@ -67,5 +52,5 @@ def judge_mol_file(mol: Chem.Mol):
 
 
 if __name__ == '__main__':
-    a = draw_func(construct_rdkit(mol_path="../../../data/mol/50115.mol"), 800, 600)
-    print(a.get('img_base64'))
\ No newline at end of file
+    a = draw_func(render_mol(construct_rdkit(mol_path="../../../data/mol/50115.mol"), 800, 600))
+    print(a.get('media_type'), len(a.get('img_bytes')))
\ No newline at end of file
@@ -1,6 +1,7 @@
 from .func import *
 from .db import *
 from app.captcha.base import BaseCaptcha
+from app.captcha.features import MolFeatures
 from app.captcha.utils import *
 
 
@@ -33,19 +34,17 @@ class AromaticCaptcha(BaseCaptcha):
         """
         核心生成逻辑：读取Mol -> 绘图 -> 返回结果
         """
-        return {
-            "img_base64": base_draw(self.rdkit_object, width=self.width, height=self.height),
-            "size": {
-                "width": self.width,
-                "height": self.height
-            }
-        }
+        return draw_func(self.get_render(), self.image_format)
 
     def generate_answer(self) -> list:
         """
         生成对应的答案
         """
-        return generate_answer(self.rdkit_object, width=self.width, height=self.height)
+        return generate_answer(
+            self.rdkit_object,
+            atom_coords=self.get_render().atom_coords,
+            rings=self.get_answers().get("rings")
+        )
 
     def generate_read_output(self) -> str:
         """未来尝试适配options，现在以跑通为准！！"""
@@ -59,8 +58,8 @@ class AromaticCaptcha(BaseCaptcha):
         """
         return base_verify(user_input=user_input, answer_data=answer_data) # 显式
 
-    def get_metadata(self, mol: Chem.Mol) -> bool:
-        return get_mol_value(mol)
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> bool:
+        return get_mol_value(mol, features)
 
 
 if __name__ == "__main__":
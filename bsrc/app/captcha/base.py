@@ -6,6 +6,10 @@ from typing import Dict, Any, Type, ClassVar, Optional
 from app.utils.logger import logger
 from rdkit import Chem
 from app.utils.exceptions import PluginException
+import app.utils.config as config
+from app.captcha.smarts import smarts_registry
+from app.captcha.features import MolFeatures
+from app.captcha.utils import render_mol, render_backend, RenderResult, pack_polygons, unpack_polygons, base_verify, load_answers
 
 
 class BaseCaptcha(ABC):
@@ -14,6 +18,9 @@ class BaseCaptcha(ABC):
     slug: ClassVar[str]
     table_name: ClassVar[str] # sqlite中的表名！！
 
+    image_format: str = config.IMAGE_FORMAT  # 出图格式，调用方可按请求覆盖
+    smarts: ClassVar[tuple] = ()  # 插件用到的 SMARTS，注册时统一编译、校验
+
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
 
@@ -29,6 +36,8 @@ class BaseCaptcha(ABC):
         if cls.slug in cls._registry:
             raise PluginException(f"Captcha slug '{cls.slug}' already registered!")
 
+        smarts_registry.register(cls.smarts, owner=cls.slug)
+
         cls._registry[cls.slug] = cls
         logger.info(f"[Plugin Registered]: {cls.slug} -> {cls.__name__}")
 
@@ -36,6 +45,17 @@ class BaseCaptcha(ABC):
     def get_plugins(cls):
         return cls._registry
 
+    def get_render(self) -> RenderResult:
+        """
+        单次绘制：出图和答案热区共用同一次 DrawMolecule
+        需要子类在 runtime 下准备好 self.rdkit_object / self.width / self.height
+        绘图后端由 image_format 决定 (svg 走 MolDraw2DSVG)，两种后端的原子坐标一致
+        """
+        if getattr(self, "_render", None) is None:
+            self._render = render_mol(self.rdkit_object, self.width, self.height, getattr(self, "mol_path", ""),
+                                      render_backend(self.image_format))
+        return self._render
+
     @abstractmethod
     def get_table_schema(self) -> str:
         """返回建表 SQL 语句"""
@@ -46,7 +66,9 @@ class BaseCaptcha(ABC):
         """
         生成验证码
         :return: {
-            "img_base64": "...",
+            "img_bytes": b"...",         # 编码后的图片 (不做 base64，由接口层按交付方式处理)
+            "media_type": "image/png",
+            "format": "png",
             "size": { ... }
         }
         """
@@ -74,11 +96,39 @@ class BaseCaptcha(ABC):
         """验证逻辑"""
         pass
 
+    def get_answers(self) -> dict:
+        """入库时预计算的答案 idx (answer_json)，runtime 只需把 idx 映射到坐标"""
+        if getattr(self, "_answers", None) is None:
+            self._answers = load_answers(getattr(self, "mol_info", None))
+        return self._answers
+
+    def output_answer(self) -> list:
+        """generate_answer 的热区在标准画布坐标系，变换到请求尺寸 (与出图同一变换)"""
+        return self.get_render().transform_polygons(self.generate_answer())
+
+    def pack_answer(self) -> dict:
+        """
+        生成时把答案几何压进 token，verify 就不必再读文件、解析、绘图
+        :return: {"poly": 量化后的多边形}  子类可追加自己需要的字段
+        """
+        return {"poly": pack_polygons(self.output_answer())}
+
+    @classmethod
+    def unpack_answer(cls, packed: dict) -> list:
+        """还原答案多边形 (DEV 模式回显 / 日志用)"""
+        return unpack_polygons(packed.get("poly", ""))
+
+    @classmethod
+    def verify_packed(cls, packed: dict, user_input: Any) -> bool:
+        """无状态验证：只依赖 token 中的答案几何，纯计算"""
+        return base_verify(user_input=user_input, answer_data=cls.unpack_answer(packed))
+
 
     @abstractmethod
-    def get_metadata(self, mol: Chem.Mol) -> Optional[Dict[str, Any]]:
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> Optional[Dict[str, Any]]:
         """
         :param mol: RDKit 分子对象
+        :param features: 入库时各插件共享的分子特征 (见 app.captcha.features)，单独调用时可不传
         :return: 一个字典，包含该插件特有的字段数据。如果返回 None，表示该分子不符合入库要求。
 
         例子: 芳香环插件返回 -> {"has_aromatic": True, "ring_count": 3}
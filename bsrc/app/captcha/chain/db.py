@@ -1,6 +1,9 @@
 from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
+from .func import get_all_longest_chains, ChainSearchTimeout
 
 def db_init(table_name):
     return (f"""
@@ -8,27 +11,36 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 carbon_count INTEGER DEFAULT 0,
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
             CREATE INDEX IF NOT EXISTS idx_{table_name}_ccount ON {table_name}(carbon_count);
     """)
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     """
     筛选逻辑：
     1. 必须有至少 5 个碳原子（太短没难度）。   // gemini是对的！！！
     2. 必须是连通的有机物（虽然 RDKit 通常处理单分子，但防守一波）。
     """
     try:
-        c_atoms = [atom for atom in mol.GetAtoms() if atom.GetSymbol() == 'C']
-        c_count = len(c_atoms)
+        features = features or MolFeatures(mol, prefilter=False)
+        c_count = len(features.carbon_indices)
 
         if c_count < 5:
             return None
 
+        try:
+            chains = get_all_longest_chains(mol)
+        except ChainSearchTimeout as e:
+            # 骨架过于复杂，标记后跳过，不让入库卡死
+            logger.warning(f"Skip mol: {e}")
+            return None
+
         return {
-            "carbon_count": c_count
+            "carbon_count": c_count,
+            "answer_json": dump_answers({"chains": chains})
         }
 
     except Exception as e:
@@ -1,102 +1,261 @@
-from app.captcha.utils import base_draw, point_to_s
+import time
+from collections import deque
 from rdkit import Chem
-from rdkit.Chem.Draw import rdMolDraw2D
+import app.utils.config as config
+from app.captcha.utils import point_to_s
+from app.captcha.hotspots import PointIndex, atom_mask, parse_clicks
+from app.utils.exceptions import PluginException
 
 
-def draw_func(mol: Chem.rdchem.Mol, width: int, height: int) -> dict:
-    b64_data = base_draw(mol, width, height)
-    return {
-        "img_base64": b64_data,
-        "size": {
-            "width": width,
-            "height": height
-        }
-    }
+class ChainSearchTimeout(PluginException):
+    """最长链搜索超出时间预算"""
+    pass
 
 
-def get_all_longest_chains(mol: Chem.Mol):
+def _carbon_components(mol: Chem.Mol) -> list:
     """
-    核心算法：寻找碳骨架中的所有最长路径。
-    返回一个列表，列表包含多个列表（多解情况），每个内部列表是原子的 indices。
-    例如: [[1, 2, 3, 4], [1, 2, 5, 6]]
+    碳骨架 (只看 C-C 键) 的连通分量。
+    每个分量返回 (nodes, adj)：nodes 为原子 idx 列表，adj[i] 为分量内局部下标的邻居列表
     """
-    # 1. 构建碳原子邻接表 (Adjacency List)
-    # 仅连接 C-C 键
     c_indices = [atom.GetIdx() for atom in mol.GetAtoms() if atom.GetSymbol() == 'C']
-    c_set = set(c_indices)
-
-    adj = {idx: [] for idx in c_indices}
+    local = {idx: i for i, idx in enumerate(c_indices)}
+    adj = [[] for _ in c_indices]
 
     for bond in mol.GetBonds():
-        b_idx = bond.GetBeginAtomIdx()
-        e_idx = bond.GetEndAtomIdx()
+        b = local.get(bond.GetBeginAtomIdx())
+        e = local.get(bond.GetEndAtomIdx())
+        if b is not None and e is not None:
+            adj[b].append(e)
+            adj[e].append(b)
 
-        if b_idx in c_set and e_idx in c_set:
-            adj[b_idx].append(e_idx)
-            adj[e_idx].append(b_idx)
+    components = []
+    seen = [False] * len(c_indices)
+    for root in range(len(c_indices)):
+        if seen[root]:
+            continue
+        seen[root] = True
+        members = [root]
+        queue = deque([root])
+        while queue:
+            u = queue.popleft()
+            for v in adj[u]:
+                if not seen[v]:
+                    seen[v] = True
+                    members.append(v)
+                    queue.append(v)
 
-    # 2. 寻找端点 (Leaves) 以优化搜索
-    # 度为1的节点最有可能是端点。但如果是全环结构，可能没有度为1的节点。
-    leaves = [idx for idx, neighbors in adj.items() if len(neighbors) == 1]
+        remap = {g: i for i, g in enumerate(members)}
+        components.append((
+            [c_indices[g] for g in members],
+            [[remap[v] for v in adj[g]] for g in members]
+        ))
 
-    # 如果没有端点（例如环己烷），或者端点很少，就把所有节点作为起点尝试
-    # 为了保证绝对正确，对于小分子，我们可以暴力遍历所有节点作为起点
-    start_nodes = leaves if leaves else c_indices
+    return components
 
-    max_len = 0
-    longest_paths = []
 
-    # 3. DFS 寻找最长路径
-    # 由于分子规模小，不需要复杂的动规，直接带路径回溯的DFS
+def _bfs(adj: list, source: int, blocked: int = -1):
+    """返回 (dist, parent)，blocked 节点不可经过"""
+    n = len(adj)
+    dist = [-1] * n
+    parent = [-1] * n
+    dist[source] = 0
+    queue = deque([source])
+    while queue:
+        u = queue.popleft()
+        for v in adj[u]:
+            if dist[v] < 0 and v != blocked:
+                dist[v] = dist[u] + 1
+                parent[v] = u
+                queue.append(v)
+    return dist, parent
+
+
+def _tree_longest_paths(adj: list) -> list:
+    """
+    无环骨架：树的直径，线性时间。
+    所有最长路径都经过中心 (直径边数为偶数时是中心点，奇数时是中心边)，
+    因此只需从中心出发，把不同分支上最深的节点两两配对。
+    """
+    n = len(adj)
+    if n == 1:
+        return [[0]]
+
+    # 两次 BFS 求一条直径 a -> b
+    dist, _ = _bfs(adj, 0)
+    a = max(range(n), key=dist.__getitem__)
+    dist, parent = _bfs(adj, a)
+    b = max(range(n), key=dist.__getitem__)
+    length = dist[b]
+
+    diameter = [b]
+    while diameter[-1] != a:
+        diameter.append(parent[diameter[-1]])
+
+    def to_center(node, par, center):
+        path = [node]
+        while path[-1] != center:
+            path.append(par[path[-1]])
+        return path
+
+    if length % 2 == 0:
+        # 中心点：各分支里距中心 r 的节点，跨分支两两组合
+        center = diameter[length // 2]
+        radius = length // 2
+        dist, par = _bfs(adj, center)
+        branches = {}
+        for v in range(n):
+            if dist[v] == radius:
+                branch = to_center(v, par, center)[-2]
+                branches.setdefault(branch, []).append(v)
+
+        groups = list(branches.values())
+        paths = []
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                for u in groups[i]:
+                    for v in groups[j]:
+                        left = to_center(u, par, center)
+                        right = to_center(v, par, center)
+                        paths.append(left + right[-2::-1])
+        return paths
+
+    # 中心边 (c1, c2)：两侧各取最深的节点组合
+    c1, c2 = diameter[length // 2], diameter[length // 2 + 1]
+    depth = length // 2
+    dist1, par1 = _bfs(adj, c1, blocked=c2)
+    dist2, par2 = _bfs(adj, c2, blocked=c1)
+    side1 = [v for v in range(n) if dist1[v] == depth]
+    side2 = [v for v in range(n) if dist2[v] == depth]
+
+    paths = []
+    for u in side1:
+        left = to_center(u, par1, c1)
+        for v in side2:
+            paths.append(left + to_center(v, par2, c2)[::-1])
+    return paths
+
+
+def _cyclic_longest_paths(adj: list, best: int, deadline: float) -> tuple:
+    """
+    含环骨架：位掩码 DFS。
+    visited 用 int 位掩码，剪枝上界 = 当前长度 + 从当前端点经未访问节点可达的节点数，
+    上界小于已知最优时直接回溯。best 传入其它分量已找到的长度，一起参与剪枝。
+    返回 (best, {mask: path})
+    """
+    n = len(adj)
+    nbr = [0] * n
+    for u in range(n):
+        for v in adj[u]:
+            nbr[u] |= 1 << v
+
+    found = {}
+    steps = 0
 
-    def dfs(current_node, visited_path):
-        nonlocal max_len, longest_paths
+    def reachable(node, visited):
+        seen = 1 << node
+        frontier = seen
+        while frontier:
+            grown = 0
+            while frontier:
+                low = frontier & -frontier
+                grown |= nbr[low.bit_length() - 1]
+                frontier ^= low
+            frontier = grown & ~visited & ~seen
+            seen |= frontier
+        return bin(seen).count("1") - 1
 
-        # 记录当前路径
-        current_len = len(visited_path)
+    for start in range(n):
+        path = [start]
+        visited = 1 << start
+        stack = [iter(adj[start])]
 
-        # 简单的剪枝：如果剩余可能的节点全加上都不够 max_len（略复杂，暂不加，速度够用）
+        while stack:
+            steps += 1
+            if not steps & 0x3ff and time.perf_counter() > deadline:
+                raise ChainSearchTimeout(f"Longest chain search exceeded budget ({n} carbons)")
 
-        is_leaf_now = True
-        for neighbor in adj[current_node]:
-            if neighbor not in visited_path:
-                is_leaf_now = False
-                dfs(neighbor, visited_path + [neighbor])  # 递归
+            node = path[-1]
+            extended = False
+            for v in stack[-1]:
+                if visited >> v & 1:
+                    continue
+                if len(path) + 1 + reachable(v, visited | 1 << v) < best:
+                    continue
+                path.append(v)
+                visited |= 1 << v
+                stack.append(iter(adj[v]))
+                extended = True
+                break
 
-        if is_leaf_now:
-            # 到达当前路线的尽头
-            if current_len > max_len:
-                max_len = current_len
-                longest_paths = [visited_path]  # 不仅更新长度，还要重置路径列表
-            elif current_len == max_len:
-                longest_paths.append(visited_path)
+            if extended:
+                continue
 
-    # 遍历起点
-    # 优化：如果是无环图(树)，从任意一点BFS找到最远点A，再从A DFS找到最远点B即可。
-    # 但为了兼容环状结构，我们简单粗暴一点遍历所有可能的端点。
-    for start_node in start_nodes:
-        dfs(start_node, [start_node])
+            # 走到尽头 (或剩余分支都被剪掉)，只有无路可走时才是极大路径
+            if not nbr[node] & ~visited:
+                if len(path) > best:
+                    best = len(path)
+                    found = {}
+                if len(path) == best and visited not in found:
+                    found[visited] = list(path)
 
-    # 去重 (因为 A->B 和 B->A 是一样的路径，且可能存了多次)
-    unique_paths = []
-    seen_sets = []
+            stack.pop()
+            path.pop()
+            visited &= ~(1 << node)
 
-    for p in longest_paths:
-        p_set = set(p)
-        if p_set not in seen_sets:
-            seen_sets.append(p_set)
-            unique_paths.append(p)
+    return best, found
 
-    return unique_paths
 
+def get_all_longest_chains(mol: Chem.Mol, time_budget: float = None) -> list:
+    """
+    核心算法：寻找碳骨架中的所有最长路径。
+    返回一个列表，列表包含多个列表（多解情况），每个内部列表是原子的 indices。
+    例如: [[1, 2, 3, 4], [1, 2, 5, 6]]
+    原子集合相同的路径只保留一条 (verify 只比较集合)。
 
-def generate_answer_coords(mol: Chem.Mol, width: int, height: int) -> list:
+    无环分量走树直径 (线性)，含环分量走带上界剪枝的位掩码 DFS；
+    超过 time_budget 秒抛 ChainSearchTimeout，而不是卡住 worker。
+    """
+    if time_budget is None:
+        time_budget = config.CHAIN_TIME_BUDGET
+    deadline = time.perf_counter() + time_budget
+
+    best = 0
+    longest_paths = []
+
+    # 大分量先算，小分量凑不够长度直接跳过
+    for nodes, adj in sorted(_carbon_components(mol), key=lambda c: -len(c[0])):
+        if len(nodes) < best:
+            continue
+
+        edges = sum(len(a) for a in adj) // 2
+        if edges == len(nodes) - 1:
+            paths = _tree_longest_paths(adj)
+            length = len(paths[0])
+            if length < best:
+                continue
+        else:
+            length, found = _cyclic_longest_paths(adj, best, deadline)
+            if length < best or not found:
+                continue
+            paths = list(found.values())
+
+        if length > best:
+            best = length
+            longest_paths = []
+        longest_paths.extend([nodes[i] for i in p] for p in paths)
+
+    return longest_paths
+
+
+def generate_answer_coords(mol: Chem.Mol, atom_coords: list, paths: list = None) -> list:
     """
     返回最长碳链的坐标区域。
     注意：这里我们返回所有可能的“正确答案”的并集，用于前端调试或提示。
     但在 verify 中，用户通常只需要选中其中一条完整的链即可。
+    paths: 入库时预计算的全部最长链，缺省时现算
     """
-    paths = get_all_longest_chains(mol)
+    if paths is None:
+        paths = get_all_longest_chains(mol)
 
     # 这里我们只拿第一条路径来生成“参考答案”的可视化
     # 实际验证逻辑在 Object.py 里处理
@@ -106,17 +265,38 @@ def generate_answer_coords(mol: Chem.Mol, width: int, height: int) -> list:
     reference_path = paths[0]
 
     valid_polygons = []
-    d2d = rdMolDraw2D.MolDraw2DCairo(width, height)
-    d2d.DrawMolecule(mol)
 
     # 将路径连成一片？或者每个原子一个框？
     # 既然是“点击所有碳原子”，那就每个原子给一个框
     for atom_idx in reference_path:
-        p = d2d.GetDrawCoords(atom_idx)
+        p = atom_coords[atom_idx]
         # 生成一个以原子为中心的小方框或点
         # 这里为了兼容 base_verify 的多边形逻辑，画一个小矩形
-        delta = 15  # 触控半径
+        delta = ANSWER_BOX  # 触控半径
         polygon = point_to_s(p, delta)
         valid_polygons.append(polygon)
 
-    return valid_polygons
\ No newline at end of file
+    return valid_polygons
+
+
+CLICK_RADIUS = 25
+ANSWER_BOX = 15  # 参考答案方框的半边长 (标准画布)
+
+
+def verify_chain_clicks(carbon_points: dict, valid_chains: list, user_input: list,
+                        radius: float = CLICK_RADIUS) -> bool:
+    """
+    carbon_points: {碳原子 idx: (x, y)}
+    用户点击的必须完全覆盖某一条最长链，且不能多选
+    每个点击映射到半径内最近的碳原子 (网格索引批量查询)，链按位掩码比较
+    点击数上限随答案放宽：最长链本身 + VERIFY_MAX_CLICKS 的余量 (重复点击)，超长链的分子也能答对
+    """
+    longest = max((len(chain) for chain in valid_chains), default=0)
+    clicks = parse_clicks(user_input, longest + config.VERIFY_MAX_CLICKS)
+    if clicks is None:
+        return False
+
+    index = PointIndex(carbon_points.keys(), list(carbon_points.values()), radius)
+    clicked = atom_mask(idx for idx in index.nearest(clicks) if idx is not None)
+
+    return clicked in {atom_mask(chain) for chain in valid_chains}
@@ -1,7 +1,11 @@
 from .func import *
 from .db import *
 from app.captcha.base import BaseCaptcha
-from app.captcha.utils import get_random_line_by_table_name, get_mol_info_by_path, construct_rdkit
+from app.captcha.features import MolFeatures
+from app.captcha.utils import get_random_line_by_table_name, get_mol_info_by_path, construct_rdkit, draw_func, \
+    pack_points, unpack_points, point_to_s
+from app.captcha.hotspots import atom_mask, mask_atoms
+from typing import Any
 
 
 
@@ -23,18 +27,24 @@ class ChainCaptcha(BaseCaptcha):
 
             self.rdkit_object = construct_rdkit(self.mol_path)
 
-            # 预计算答案，供 verify 使用
-            self.valid_chains = get_all_longest_chains(self.rdkit_object)
+            # 答案优先取入库时预计算的，旧库回退现算
+            self.valid_chains = self.get_answers().get("chains")
+            if self.valid_chains is None:
+                self.valid_chains = get_all_longest_chains(self.rdkit_object)
 
     def get_table_schema(self) -> str:
         return db_init(self.table_name)
 
     def generate_img(self) -> dict:
-        return draw_func(self.rdkit_object, width=self.width, height=self.height)
+        return draw_func(self.get_render(), self.image_format)
 
     def generate_answer(self) -> list:
         # 返回第一条最长链作为前端参考
-        return generate_answer_coords(self.rdkit_object, width=self.width, height=self.height)
+        return generate_answer_coords(
+            self.rdkit_object,
+            atom_coords=self.get_render().atom_coords,
+            paths=self.valid_chains
+        )
 
     def generate_read_output(self) -> str:
         return "请点击图中的【最长碳链】（需选中链上的每一个碳原子）"
@@ -48,51 +58,51 @@ class ChainCaptcha(BaseCaptcha):
         1. 将用户点击的坐标映射回 原子ID (Atom Index)。
         2. 检查这些 ID 组成的集合，是否与 self.valid_chains 中的任意一条完全匹配。
         """
+        # 坐标直接取自出图时的那次绘制
+        return verify_chain_clicks(self._carbon_points(), self.valid_chains, user_input, self._click_radius())
 
-        # 1. 坐标转原子ID
-        # 我们需要重新获取 d2d 对象来计算坐标映射（稍微有点耗时，但在验证阶段可接受）
-        d2d = rdMolDraw2D.MolDraw2DCairo(self.width, self.height)
-        d2d.DrawMolecule(self.rdkit_object)
+    def _carbon_points(self) -> dict:
+        """碳原子 idx -> 请求尺寸下的绘图坐标 (只有碳原子才有效)"""
+        render = self.get_render()
+        carbon_indices = [atom.GetIdx() for atom in self.rdkit_object.GetAtoms() if atom.GetSymbol() == 'C']
+        points = render.to_output([render.atom_coords[idx] for idx in carbon_indices])
+        return dict(zip(carbon_indices, points))
 
-        clicked_atom_indices = set()
+    def _click_radius(self) -> float:
+        """判定半径随画布缩放"""
+        return CLICK_RADIUS * self.get_render().scale
 
-        for click in user_input:
-            click_x, click_y = click['x'], click['y']
-
-            # RDKit 没有直接的 GetAtomAtPoint，我们需要手动计算距离
-            closest_idx = -1
-            min_dist = float('inf')
-
-            for atom in self.rdkit_object.GetAtoms():
-                idx = atom.GetIdx()
-                # 只有碳原子才有效
-                if atom.GetSymbol() != 'C':
-                    continue
-
-                p = d2d.GetDrawCoords(idx)
-                dist = ((p.x - click_x) ** 2 + (p.y - click_y) ** 2) ** 0.5
-
-                # 判定半径，例如 20px
-                if dist < 25:
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_idx = idx
-
-            if closest_idx != -1:
-                clicked_atom_indices.add(closest_idx)
-
-        # 2. 匹配答案
-        # 用户点击的必须完全覆盖某一条最长链，且不能多选
-        for chain in self.valid_chains:
-            chain_set = set(chain)
-            if clicked_atom_indices == chain_set:
-                return True
-
-        # 调试日志（生产环境可去掉）
-        # print(f"User clicked: {clicked_atom_indices}")
-        # print(f"Valid chains: {self.valid_chains}")
-
-        return False
-
-    def get_metadata(self, mol: Chem.Mol) -> bool:
-        return get_mol_value(mol)
\ No newline at end of file
+    def pack_answer(self) -> dict:
+        """
+        只放 verify_chain_clicks 用得到的：碳原子坐标 (按碳原子顺序)、判定半径、
+        每条合法链在这个顺序下的位掩码 (十六进制)；不放原子 idx 和参考多边形
+        """
+        carbon_points = self._carbon_points()
+        position = {idx: i for i, idx in enumerate(carbon_points)}
+        return {
+            "cp": pack_points(list(carbon_points.values())),
+            "ch": [format(atom_mask(position[idx] for idx in chain), "x") for chain in self.valid_chains],
+            "r": round(self._click_radius(), 2),
+        }
+
+    @classmethod
+    def _unpack_chains(cls, packed: dict) -> tuple:
+        """(碳原子坐标列表, 每条链的坐标下标列表)"""
+        return unpack_points(packed.get("cp", "")), [mask_atoms(int(mask, 16)) for mask in packed.get("ch", [])]
+
+    @classmethod
+    def unpack_answer(cls, packed: dict) -> list:
+        """参考答案 (第一条链) 的热区，与 generate_answer 同样大小的方框"""
+        points, chains = cls._unpack_chains(packed)
+        if not chains:
+            return []
+        delta = ANSWER_BOX * packed.get("r", CLICK_RADIUS) / CLICK_RADIUS
+        return [point_to_s(points[i], delta) for i in chains[0]]
+
+    @classmethod
+    def verify_packed(cls, packed: dict, user_input: Any) -> bool:
+        points, chains = cls._unpack_chains(packed)
+        return verify_chain_clicks(dict(enumerate(points)), chains, user_input, packed.get("r", CLICK_RADIUS))
+
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> bool:
+        return get_mol_value(mol, features)
\ No newline at end of file
@@ -1,6 +1,8 @@
 from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
 
 def db_init(table_name):
     return (f"""
@@ -8,6 +10,7 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 has_chiral BOOLEAN DEFAULT 0,
                 chiral_count INTEGER DEFAULT 0,
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -15,17 +18,19 @@ def db_init(table_name):
             CREATE INDEX IF NOT EXISTS idx_{table_name}_chiral ON {table_name}(has_chiral);
     """)
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     try:
+        features = features or MolFeatures(mol, prefilter=False)
         # 寻找手性中心 (includeUnassigned=False 确保是明确标记的手性)  ????  shit gemini   为什么要标明R/S  是手性碳就行w
-        chiral_centers = Chem.FindMolChiralCenters(mol, includeUnassigned=True)
+        chiral_centers = features.chiral_centers
 
         if not chiral_centers:
             return None
 
         return {
             "has_chiral": True,
-            "chiral_count": len(chiral_centers)
+            "chiral_count": len(chiral_centers),
+            "answer_json": dump_answers({"centers": [idx for idx, _ in chiral_centers]})
         }
 
     except Exception as e:
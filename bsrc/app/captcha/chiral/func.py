@@ -1,28 +1,25 @@
 from app.utils.logger import logger
 from rdkit import Chem
-from rdkit.Chem.Draw import rdMolDraw2D
 
 
 BOX_RADIUS = 20
 
 
-def generate_answer(mol: Chem.Mol, width: int, height: int) -> list:
+def generate_answer(mol: Chem.Mol, atom_coords: list, centers: list = None) -> list:
     """
     返回所有手性碳原子的【判定多边形】列表。
     这里我们将以原子坐标为中心，生成一个正方形作为点击热区。
+    centers: 入库时预计算的手性中心 idx，缺省时现算
     """
     valid_polygons = []
 
-    d2d = rdMolDraw2D.MolDraw2DCairo(width, height)
-    d2d.DrawMolecule(mol)
+    if centers is None:
+        chiral_centers = Chem.FindMolChiralCenters(mol, includeUnassigned=True)  # 2轮修复！！！
+        centers = [center_info[0] for center_info in chiral_centers]
 
-    chiral_centers = Chem.FindMolChiralCenters(mol, includeUnassigned=True)  # 2轮修复！！！
+    for atom_idx in centers:
 
-    for center_info in chiral_centers:
-        atom_idx = center_info[0]
-
-        p = d2d.GetDrawCoords(atom_idx)
-        x, y = p.x, p.y
+        x, y = atom_coords[atom_idx]
 
         polygon = [
             (x - BOX_RADIUS, y - BOX_RADIUS),
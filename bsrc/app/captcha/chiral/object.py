@@ -1,6 +1,7 @@
 from .func import generate_answer
 from .db import db_init, get_mol_value
 from app.captcha.base import BaseCaptcha
+from app.captcha.features import MolFeatures
 from app.captcha.utils import *
 from rdkit import Chem
 from typing import Any
@@ -27,16 +28,14 @@ class ChiralCaptcha(BaseCaptcha):
         return db_init(self.table_name)
 
     def generate_img(self) -> dict:
-        return {
-            "img_base64":base_draw(self.rdkit_object, width=self.width, height=self.height),
-            "size": {
-                "width": self.width,
-                "height": self.height
-            }
-        }
+        return draw_func(self.get_render(), self.image_format)
 
     def generate_answer(self) -> list:
-        return generate_answer(self.rdkit_object, width=self.width, height=self.height)
+        return generate_answer(
+            self.rdkit_object,
+            atom_coords=self.get_render().atom_coords,
+            centers=self.get_answers().get("centers")
+        )
 
     def generate_read_output(self) -> str:
         return "请点击图片中【所有的】手性碳原子（带有楔形键的中心）"
@@ -44,5 +43,5 @@ class ChiralCaptcha(BaseCaptcha):
     def verify(self, answer_data: list, user_input: Any) -> bool:
         return base_verify(user_input=user_input, answer_data=answer_data)
 
-    def get_metadata(self, mol: Chem.Mol) -> bool:
-        return get_mol_value(mol)
\ No newline at end of file
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> bool:
+        return get_mol_value(mol, features)
\ No newline at end of file
@@ -1,6 +1,8 @@
 from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
 
 
 def db_init(table_name):
@@ -9,6 +11,7 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 has_isomer BOOLEAN DEFAULT 0,
                 isomer_count INTEGER DEFAULT 0,
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -17,22 +20,19 @@ def db_init(table_name):
     """)
 
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     try:
-        Chem.AssignStereochemistry(mol, force=False, cleanIt=True)
-
-        isomer_count = 0
-        for bond in mol.GetBonds():
-            if bond.GetBondType() == Chem.BondType.DOUBLE and \
-                    bond.GetStereo() > Chem.BondStereo.STEREOANY:
-                isomer_count += 1
+        features = features or MolFeatures(mol, prefilter=False)
+        isomer_bonds = features.stereo_bonds
+        isomer_count = len(isomer_bonds)
 
         if isomer_count == 0:
             return None
 
         return {
             "has_isomer": True,
-            "isomer_count": isomer_count
+            "isomer_count": isomer_count,
+            "answer_json": dump_answers({"bonds": isomer_bonds})
         }
 
     except Exception as e:
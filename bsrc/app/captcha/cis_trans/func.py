@@ -1,34 +1,30 @@
 from app.utils.logger import logger
 from rdkit import Chem
-from rdkit.Chem.Draw import rdMolDraw2D
 import math
 
 BOX_PADDING = 15
 
 
-def generate_answer(mol: Chem.Mol, width: int, height: int) -> list:
+def generate_answer(mol: Chem.Mol, atom_coords: list, bonds: list = None) -> list:
     """
     返回所有顺反异构双键的【判定多边形】列表。
+    bonds: 入库时预计算的双键两端原子 idx，缺省时现算
     """
     valid_polygons = []
 
-    d2d = rdMolDraw2D.MolDraw2DCairo(width, height)
-    d2d.DrawMolecule(mol)
-
-    Chem.AssignStereochemistry(mol, force=False, cleanIt=True)
-
-    for bond in mol.GetBonds():
-        if bond.GetBondType() == Chem.BondType.DOUBLE and \
-                bond.GetStereo() > Chem.BondStereo.STEREOANY:
-
-            b_atom_idx = bond.GetBeginAtomIdx()
-            e_atom_idx = bond.GetEndAtomIdx()
+    if bonds is None:
+        Chem.AssignStereochemistry(mol, force=False, cleanIt=True)
+        bonds = [
+            (bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()) for bond in mol.GetBonds()
+            if bond.GetBondType() == Chem.BondType.DOUBLE and bond.GetStereo() > Chem.BondStereo.STEREOANY
+        ]
 
-            p1 = d2d.GetDrawCoords(b_atom_idx)
-            p2 = d2d.GetDrawCoords(e_atom_idx)
+    for b_atom_idx, e_atom_idx in bonds:
+        x1, y1 = atom_coords[b_atom_idx]
+        x2, y2 = atom_coords[e_atom_idx]
 
-            poly = create_rect_from_line(p1.x, p1.y, p2.x, p2.y, BOX_PADDING)
-            valid_polygons.append(poly)
+        poly = create_rect_from_line(x1, y1, x2, y2, BOX_PADDING)
+        valid_polygons.append(poly)
 
     return valid_polygons
 
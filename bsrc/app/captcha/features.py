@@ -0,0 +1,96 @@
+"""
+入库用的分子特征：
+classify_runner 对每个分子只构造一次 MolFeatures，依次交给各插件的 get_metadata，
+原子符号/度数、环信息、手性中心、双键立体这些公共量各算一次，
+所有插件的 SMARTS 先经 FilterCatalog 一次性预筛，只对命中的模式再取全部匹配。
+各项均在第一次访问时计算，计算顺序与插件调用顺序一致 (双键立体会原地修改分子)。
+"""
+import time
+from functools import cached_property
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+import numpy as np
+from rdkit import Chem
+from app.captcha.smarts import smarts_registry
+
+
+class MolFeatures:
+    def __init__(self, mol: Chem.Mol, prefilter: bool = True):
+        """
+        :param prefilter: 是否用 FilterCatalog 预筛 (单个插件单独调用时没必要)
+        """
+        self.mol = mol
+        self.prefilter = prefilter
+        self._matches: Dict[str, list] = {}
+
+    @cached_property
+    def symbols(self) -> List[str]:
+        return [atom.GetSymbol() for atom in self.mol.GetAtoms()]
+
+    @cached_property
+    def degrees(self) -> np.ndarray:
+        """重原子邻居数 (不含 H)"""
+        return np.fromiter((atom.GetDegree() for atom in self.mol.GetAtoms()), dtype=np.int32,
+                           count=self.mol.GetNumAtoms())
+
+    @cached_property
+    def aromatic(self) -> np.ndarray:
+        return np.fromiter((atom.GetIsAromatic() for atom in self.mol.GetAtoms()), dtype=bool,
+                           count=self.mol.GetNumAtoms())
+
+    @cached_property
+    def carbon_indices(self) -> List[int]:
+        return [idx for idx, symbol in enumerate(self.symbols) if symbol == 'C']
+
+    @cached_property
+    def atom_rings(self) -> tuple:
+        return self.mol.GetRingInfo().AtomRings()
+
+    @cached_property
+    def chiral_centers(self) -> list:
+        """[(atom idx, 'R'/'S'/'?')]，含未标注的"""
+        return Chem.FindMolChiralCenters(self.mol, includeUnassigned=True)
+
+    @cached_property
+    def stereo_bonds(self) -> List[List[int]]:
+        """有明确顺反构型的双键 [[begin, end], ...]"""
+        Chem.AssignStereochemistry(self.mol, force=False, cleanIt=True)
+        return [
+            [bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()]
+            for bond in self.mol.GetBonds()
+            if bond.GetBondType() == Chem.BondType.DOUBLE and bond.GetStereo() > Chem.BondStereo.STEREOANY
+        ]
+
+    @cached_property
+    def _prefilter(self) -> Optional[Tuple[Set[str], FrozenSet[str]]]:
+        """FilterCatalog 预筛：(命中的 SMARTS, catalog 覆盖的 SMARTS)，每个模式的命中/未命中都记进注册表"""
+        if not self.prefilter:
+            return None
+        catalog, covered = smarts_registry.filter_catalog()
+        start = time.perf_counter()
+        hits = {entry.GetDescription() for entry in catalog.GetMatches(self.mol)}
+        smarts_registry.record_prefilter(hits, covered, time.perf_counter() - start)
+        return hits, covered
+
+    def _verdict(self, smarts: str) -> Optional[bool]:
+        """预筛结论：命中 / 未命中，没预筛或 catalog 里没有这个模式时为 None"""
+        if self._prefilter is None:
+            return None
+        hits, covered = self._prefilter
+        if smarts not in covered:
+            return None
+        return smarts in hits
+
+    def has_match(self, smarts: str) -> bool:
+        if smarts in self._matches:
+            return bool(self._matches[smarts])
+        verdict = self._verdict(smarts)
+        if verdict is not None:
+            return verdict
+        return smarts_registry.has_match(self.mol, smarts)
+
+    def matches(self, smarts: str) -> list:
+        """SMARTS 的全部匹配 (同一模式只算一次，预筛未命中的直接为空)"""
+        if smarts not in self._matches:
+            verdict = self._verdict(smarts)
+            self._matches[smarts] = [] if verdict is False else smarts_registry.matches(self.mol, smarts)
+        return self._matches[smarts]
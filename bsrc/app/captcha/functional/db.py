@@ -3,6 +3,8 @@ from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
 from .definitions import FUNCTIONAL_GROUPS
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
 
 
 def db_init(table_name):
@@ -11,6 +13,7 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 groups_json TEXT, 
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
@@ -18,24 +21,28 @@ def db_init(table_name):
     """)
 
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     """
     入库时的筛选逻辑：
     检查分子包含哪些定义的官能团，如果一个都没有，则不入库（返回 None）。
     """
     try:
+        features = features or MolFeatures(mol, prefilter=False)
         found_groups = []
+        answers = {}
 
         for name, smarts in FUNCTIONAL_GROUPS.items():
-            pattern = Chem.MolFromSmarts(smarts)
-            if mol.HasSubstructMatch(pattern):
+            matches = features.matches(smarts)
+            if matches:
                 found_groups.append(name)
+                answers[smarts] = matches
 
         if not found_groups:
             return None
 
         return {
-            "groups_json": json.dumps(found_groups, ensure_ascii=False)
+            "groups_json": json.dumps(found_groups, ensure_ascii=False),
+            "answer_json": dump_answers(answers)
         }
 
     except Exception as e:
@@ -2,12 +2,14 @@ import random
 from .db import *
 from .definitions import FUNCTIONAL_GROUPS
 from app.captcha.base import BaseCaptcha
+from app.captcha.features import MolFeatures
 from app.captcha.utils import *
 
 
 class FunctionalCaptcha(BaseCaptcha):
     slug = "functional"
     table_name = "functional_groups"
+    smarts = tuple(FUNCTIONAL_GROUPS.values())
 
     def __init__(self, width, height, runtime=True, mol_path = ""):
         self.width = width
@@ -39,7 +41,7 @@ class FunctionalCaptcha(BaseCaptcha):
         return db_init(self.table_name)
 
     def generate_img(self) -> dict:
-        return draw_func(self.rdkit_object, width=self.width, height=self.height)
+        return draw_func(self.get_render(), self.image_format)
 
     def generate_answer(self) -> list:
         """
@@ -47,9 +49,9 @@ class FunctionalCaptcha(BaseCaptcha):
         """
         return generate_answer_coords(
             self.rdkit_object,
-            width=self.width,
-            height=self.height,
-            target_smarts=self.target_smarts
+            atom_coords=self.get_render().atom_coords,
+            target_smarts=self.target_smarts,
+            matches=self.get_answers().get(self.target_smarts)
         )
 
     def generate_read_output(self) -> str:
@@ -58,6 +60,6 @@ class FunctionalCaptcha(BaseCaptcha):
     def verify(self, answer_data: list, user_input: Any) -> bool:
         return base_verify(user_input=user_input, answer_data=answer_data)
 
-    def get_metadata(self, mol: Chem.Mol) -> bool:
-        return get_mol_value(mol)
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> bool:
+        return get_mol_value(mol, features)
 
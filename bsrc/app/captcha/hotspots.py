@@ -0,0 +1,172 @@
+"""
+答案热区的命中判定：
+SMARTS 多次匹配共享原子时会产生完全重合的热区，逐点逐多边形的纯 Python 射线法是 O(点击 x 多边形 x 顶点)。
+这里先去重，把多边形的边展开成 NumPy 数组，按均匀网格分桶 (包围盒)，
+所有点击只和所在格子里的候选多边形一次性批量做射线判定。
+"""
+from typing import Any, List, Optional, Tuple
+import numpy as np
+import app.utils.config as config
+
+
+def parse_clicks(user_input: Any, limit: int) -> Optional[np.ndarray]:
+    """
+    前端点击 [{"x": .., "y": ..}, ...] -> (N, 2) float64
+    不是列表或超过 limit 个点击返回 None (调用方按失败处理)
+    """
+    if not isinstance(user_input, list) or len(user_input) > limit:
+        return None
+    points = np.empty((len(user_input), 2), dtype=np.float64)
+    for i, click in enumerate(user_input):
+        points[i, 0] = float(click.get('x', -1))
+        points[i, 1] = float(click.get('y', -1))
+    return points
+
+
+class HotspotIndex:
+    """
+    多边形热区索引
+    判定与 is_point_in_polygon 完全一致：边 (p1, p2) 满足 min(y) < y <= max(y) 且 x <= 交点 x 时翻转一次
+    """
+
+    def __init__(self, polygons: List[List[Tuple[float, float]]], cell: float = None):
+        self.cell = float(cell or config.VERIFY_GRID_CELL)
+
+        # 去重：按 token 量化精度 (1/4 px) 比较顶点，完全重合的热区只留一个 (命中任一即命中全部，语义不变)
+        unique, seen = [], set()
+        for polygon in polygons:
+            if not polygon:
+                continue
+            key = tuple(np.rint(np.asarray(polygon, dtype=np.float64) * 4).astype(np.int64).ravel())
+            if key not in seen:
+                seen.add(key)
+                unique.append(np.asarray(polygon, dtype=np.float64).reshape(-1, 2))
+        self.polygons = unique
+
+        # 所有边展开：(x1, y1, x2, y2)，edge_offsets[i]:edge_offsets[i+1] 是第 i 个多边形的边
+        counts = np.array([len(p) for p in unique], dtype=np.int64)
+        self.edge_offsets = np.concatenate([[0], np.cumsum(counts)])
+        if unique:
+            starts = np.concatenate(unique)
+            ends = np.concatenate([np.roll(p, -1, axis=0) for p in unique])
+            bbox = np.array([(p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()) for p in unique])
+        else:
+            starts = ends = np.empty((0, 2))
+            bbox = np.empty((0, 4))
+        self.x1, self.y1 = starts[:, 0], starts[:, 1]
+        self.x2, self.y2 = ends[:, 0], ends[:, 1]
+
+        # 网格：包围盒覆盖到的每个格子都挂上该多边形
+        self._grid = {}
+        cells = np.floor(bbox / self.cell).astype(np.int64)
+        for idx, (cx0, cy0, cx1, cy1) in enumerate(cells.tolist()):
+            for gx in range(cx0, cx1 + 1):
+                for gy in range(cy0, cy1 + 1):
+                    self._grid.setdefault((gx, gy), []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.polygons)
+
+    def hits(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量判定 (N, 2) 个点击
+        :return: (click_idx, polygon_idx) 所有命中对
+        """
+        cells = np.floor(points / self.cell).astype(np.int64)
+        pair_click, pair_poly = [], []
+        for i, (gx, gy) in enumerate(cells.tolist()):
+            candidates = self._grid.get((gx, gy))
+            if candidates:
+                pair_click.extend([i] * len(candidates))
+                pair_poly.extend(candidates)
+        if not pair_click:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        pair_click = np.asarray(pair_click, dtype=np.int64)
+        pair_poly = np.asarray(pair_poly, dtype=np.int64)
+
+        # 每个 (点击, 候选多边形) 对展开成它的所有边
+        edge_counts = self.edge_offsets[pair_poly + 1] - self.edge_offsets[pair_poly]
+        pair_of_edge = np.repeat(np.arange(len(pair_poly)), edge_counts)
+        edge = (np.arange(pair_of_edge.size)
+                - np.repeat(np.cumsum(edge_counts) - edge_counts, edge_counts)
+                + self.edge_offsets[pair_poly][pair_of_edge])
+
+        x = points[pair_click[pair_of_edge], 0]
+        y = points[pair_click[pair_of_edge], 1]
+        x1, y1, x2, y2 = self.x1[edge], self.y1[edge], self.x2[edge], self.y2[edge]
+
+        spans = (y > np.minimum(y1, y2)) & (y <= np.maximum(y1, y2))  # 成立时 y1 != y2
+        dy = np.where(spans, y2 - y1, 1.0)
+        xin = (y - y1) * (x2 - x1) / dy + x1
+        crossing = spans & (x <= np.maximum(x1, x2)) & (x <= xin)
+
+        inside = np.bincount(pair_of_edge[crossing], minlength=len(pair_poly)) % 2 == 1
+        return pair_click[inside], pair_poly[inside]
+
+
+class PointIndex:
+    """
+    点热区 (如碳原子) 的网格索引，格子边长取判定半径，最近点只需查周围 3x3 个格子
+    判定与逐点比较一致：距离严格小于半径，距离相同取 keys 中靠前的
+    """
+
+    def __init__(self, keys: list, points: List[Tuple[float, float]], radius: float):
+        self.keys = list(keys)
+        self.radius = float(radius)
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        self._grid = {}
+        cells = np.floor(self.points / self.radius).astype(np.int64) if self.radius > 0 else np.zeros((0, 2))
+        for i, (gx, gy) in enumerate(cells.tolist()):
+            self._grid.setdefault((gx, gy), []).append(i)
+
+    def nearest(self, clicks: np.ndarray) -> list:
+        """每个点击在半径内最近的点的 key，没有命中为 None"""
+        result = [None] * len(clicks)
+        if not self._grid or not len(clicks):
+            return result
+
+        cells = np.floor(clicks / self.radius).astype(np.int64)
+        pair_click, pair_point = [], []
+        for i, (gx, gy) in enumerate(cells.tolist()):
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    candidates = self._grid.get((gx + dx, gy + dy))
+                    if candidates:
+                        pair_click.extend([i] * len(candidates))
+                        pair_point.extend(candidates)
+        if not pair_click:
+            return result
+
+        pair_click = np.asarray(pair_click, dtype=np.int64)
+        pair_point = np.asarray(pair_point, dtype=np.int64)
+        dist = np.hypot(*(clicks[pair_click] - self.points[pair_point]).T)
+
+        within = dist < self.radius
+        pair_click, pair_point, dist = pair_click[within], pair_point[within], dist[within]
+        # 按 (点击, 距离, 点序号) 排序，每个点击取第一个
+        order = np.lexsort((pair_point, dist, pair_click))
+        first = order[np.r_[True, pair_click[order][1:] != pair_click[order][:-1]]] if order.size else order
+        for i, j in zip(pair_click[first].tolist(), pair_point[first].tolist()):
+            result[i] = self.keys[j]
+        return result
+
+
+def atom_mask(indices) -> int:
+    """原子 idx 集合 -> 位掩码，整条链的比较变成一次整数比较"""
+    mask = 0
+    for idx in indices:
+        mask |= 1 << idx
+    return mask
+
+
+def mask_atoms(mask: int) -> List[int]:
+    """atom_mask 的逆：位掩码 -> 置位的下标 (升序)"""
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(low.bit_length() - 1)
+        mask ^= low
+    return indices
@@ -0,0 +1,79 @@
+"""
+解析后的 RDKit 分子缓存：
+construct_rdkit 每次都要 readlines -> 修 V2000 -> MolFromMolBlock -> SanitizeMol，
+题库小或者抽样偏斜时大部分都是重复劳动。
+按原子数计预算的 LRU，调用方拿到的永远是副本 (cis_trans 的 AssignStereochemistry 会原地修改分子)。
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+from rdkit import Chem
+
+
+class MolCache:
+    def __init__(self, max_atoms: int):
+        """
+        :param max_atoms: 缓存中分子原子数之和的上限
+        """
+        self.max_atoms = max_atoms
+        self._items: "OrderedDict[Hashable, Chem.Mol]" = OrderedDict()
+        self._atoms = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _cost(mol: Chem.Mol) -> int:
+        return max(mol.GetNumAtoms(), 1)
+
+    def get(self, key: Hashable, loader: Callable[[], Chem.Mol]) -> Chem.Mol:
+        """命中返回副本；未命中调用 loader 解析后入缓存，同样返回副本"""
+        with self._lock:
+            mol = self._items.get(key)
+            if mol is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return Chem.Mol(mol)
+            self.misses += 1
+
+        mol = loader()  # 解析在锁外进行
+        self.put(key, mol)
+        return Chem.Mol(mol)
+
+    def put(self, key: Hashable, mol: Chem.Mol):
+        cost = self._cost(mol)
+        if cost > self.max_atoms:
+            return
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._atoms -= self._cost(old)
+
+            self._items[key] = Chem.Mol(mol)
+            self._atoms += cost
+
+            while self._atoms > self.max_atoms and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._atoms -= self._cost(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._atoms = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "atoms": self._atoms,
+                "max_atoms": self.max_atoms,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
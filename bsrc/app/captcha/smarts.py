@@ -0,0 +1,135 @@
+"""
+进程内全局 SMARTS 注册表：
+每个模式只编译一次 (插件注册时就编译并校验，写错的 SMARTS 启动即报错)，
+入库分类和在线出题共用，并按模式统计匹配次数、命中次数和累计耗时。
+经 FilterCatalog 预筛的另计 prefilter_calls / prefilter_hits，耗时按模式数均摊计入 total_ms。
+计数是进程内的，渲染进程池的子进程各自统计。
+"""
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from rdkit import Chem
+from rdkit.Chem import FilterCatalog
+from app.utils.exceptions import PluginException
+
+
+class SmartsRegistry:
+    def __init__(self):
+        self._patterns: Dict[str, Chem.Mol] = {}
+        self._owners: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        # smarts -> [调用次数, 命中次数, 累计耗时 (秒), 预筛次数, 预筛命中次数]
+        self._stats: Dict[str, list] = {}
+        self._catalog: Optional[Tuple[FilterCatalog.FilterCatalog, FrozenSet[str]]] = None
+
+    def register(self, smarts_list: Iterable[str], owner: str = ""):
+        """插件注册时调用：编译并校验所有模式"""
+        for smarts in smarts_list:
+            self.get(smarts)
+            if owner:
+                with self._lock:
+                    self._owners.setdefault(smarts, set()).add(owner)
+
+    def get(self, smarts: str) -> Chem.Mol:
+        pattern = self._patterns.get(smarts)
+        if pattern is not None:
+            return pattern
+
+        pattern = Chem.MolFromSmarts(smarts)
+        if pattern is None:
+            raise PluginException(f"Invalid SMARTS: {smarts}")
+        with self._lock:
+            pattern = self._patterns.setdefault(smarts, pattern)
+            self._stats.setdefault(smarts, [0, 0, 0.0, 0, 0])
+        return pattern
+
+    def _record(self, smarts: str, hit: bool, elapsed: float):
+        with self._lock:
+            entry = self._stats[smarts]
+            entry[0] += 1
+            entry[1] += hit
+            entry[2] += elapsed
+
+    def record_prefilter(self, hits: Iterable[str], covered: Iterable[str], elapsed: float):
+        """一次 FilterCatalog.GetMatches 覆盖的所有模式各记一次预筛，耗时均摊"""
+        hits = set(hits)
+        covered = list(covered)
+        share = elapsed / len(covered) if covered else 0.0
+        with self._lock:
+            for smarts in covered:
+                entry = self._stats[smarts]
+                entry[2] += share
+                entry[3] += 1
+                entry[4] += smarts in hits
+
+    def matches(self, mol: Chem.Mol, smarts: str) -> list:
+        """SMARTS 的全部匹配，转成可 json 化的 list"""
+        pattern = self.get(smarts)
+        start = time.perf_counter()
+        result = [list(m) for m in mol.GetSubstructMatches(pattern)]
+        self._record(smarts, bool(result), time.perf_counter() - start)
+        return result
+
+    def has_match(self, mol: Chem.Mol, smarts: str) -> bool:
+        pattern = self.get(smarts)
+        start = time.perf_counter()
+        result = mol.HasSubstructMatch(pattern)
+        self._record(smarts, result, time.perf_counter() - start)
+        return result
+
+    def filter_catalog(self) -> Tuple[FilterCatalog.FilterCatalog, FrozenSet[str]]:
+        """
+        已注册模式的 FilterCatalog：一次 GetMatches 在 C++ 里过完所有模式，返回 (catalog, 其中的 SMARTS)
+        有新模式注册时重建
+        """
+        catalog = self._catalog
+        if catalog is not None and len(catalog[1]) == len(self._patterns):
+            return catalog
+
+        with self._lock:
+            patterns = dict(self._patterns)
+        filter_catalog = FilterCatalog.FilterCatalog()
+        for smarts, pattern in patterns.items():
+            matcher = FilterCatalog.SmartsMatcher(smarts, pattern, 1)
+            filter_catalog.AddEntry(FilterCatalog.FilterCatalogEntry(smarts, matcher))
+        self._catalog = (filter_catalog, frozenset(patterns))
+        return self._catalog
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def stats(self) -> dict:
+        with self._lock:
+            items = [(smarts, list(entry), sorted(self._owners.get(smarts, ())))
+                     for smarts, entry in self._stats.items()]
+        return {
+            smarts: {
+                "owners": owners,
+                "calls": calls,
+                "hits": hits,
+                "prefilter_calls": prefilter_calls,
+                "prefilter_hits": prefilter_hits,
+                "total_ms": round(elapsed * 1000, 2),
+                "avg_us": round(elapsed / (calls + prefilter_calls) * 1e6, 2) if calls + prefilter_calls else 0.0,
+            }
+            for smarts, (calls, hits, elapsed, prefilter_calls, prefilter_hits), owners in items
+        }
+
+
+smarts_registry = SmartsRegistry()
+
+
+def merge_smarts_stats(per_process: List[dict]) -> dict:
+    """多个进程各自的 stats() 按模式汇总 (并行入库的子进程、渲染子进程)"""
+    merged = {}
+    for stats in per_process:
+        for smarts, entry in stats.items():
+            total = merged.setdefault(smarts, {"owners": entry["owners"], "calls": 0, "hits": 0,
+                                               "prefilter_calls": 0, "prefilter_hits": 0, "total_ms": 0.0})
+            for key in ("calls", "hits", "prefilter_calls", "prefilter_hits", "total_ms"):
+                total[key] += entry[key]
+    for entry in merged.values():
+        evaluations = entry["calls"] + entry["prefilter_calls"]
+        entry["avg_us"] = round(entry["total_ms"] * 1000 / evaluations, 2) if evaluations else 0.0
+        entry["total_ms"] = round(entry["total_ms"], 2)
+    return merged
@@ -1,6 +1,8 @@
 from rdkit import Chem
 from app.utils.logger import logger
 from app.utils.exceptions import PluginException
+from app.captcha.utils import dump_answers
+from app.captcha.features import MolFeatures
 
 
 def db_init(table_name):
@@ -9,6 +11,7 @@ def db_init(table_name):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 path TEXT NOT NULL,
+                answer_json TEXT,
                 max_degree INTEGER DEFAULT 0,
                 processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
@@ -16,31 +19,28 @@ def db_init(table_name):
     """)
 
 
-def get_mol_value(mol: Chem.Mol):
+def get_mol_value(mol: Chem.Mol, features: MolFeatures = None):
     """
     筛选逻辑：
     寻找分子中碳原子的最大连接数 (Degree)。
     如果最大连接数 < 3 (即只有伯碳和仲碳)，则认为该分子太简单/无位阻特征，不入库。
     """
     try:
-        max_degree = 0
-        has_carbon = False
-
-        for atom in mol.GetAtoms():
-            if atom.GetSymbol() == 'C':
-                has_carbon = True
-                # GetDegree() 返回重原子邻居数量 (不含 H)
-                # 对于标准有机物，季碳=4, 叔碳=3
-                degree = atom.GetDegree()
-                if degree > max_degree:
-                    max_degree = degree
+        features = features or MolFeatures(mol, prefilter=False)
+        carbons = features.carbon_indices
+        # degrees 为重原子邻居数量 (不含 H)，对于标准有机物，季碳=4, 叔碳=3
+        carbon_degrees = features.degrees[carbons]
+        max_degree = int(carbon_degrees.max()) if carbons else 0
 
         # 门槛：至少要有叔碳 (Degree >= 3)
-        if not has_carbon or max_degree < 3:
+        if max_degree < 3:
             return None
 
+        # 与 get_most_hindered_indices 相同：度数最大的碳原子，按 idx 顺序
+        hindered = [idx for idx, degree in zip(carbons, carbon_degrees.tolist()) if degree == max_degree]
         return {
-            "max_degree": max_degree
+            "max_degree": max_degree,
+            "answer_json": dump_answers({"atoms": hindered})
         }
 
     except Exception as e:
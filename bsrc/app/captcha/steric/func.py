@@ -1,17 +1,5 @@
-from app.captcha.utils import base_draw, point_to_s
+from app.captcha.utils import point_to_s
 from rdkit import Chem
-from rdkit.Chem.Draw import rdMolDraw2D
-
-
-def draw_func(mol: Chem.rdchem.Mol, width: int, height: int) -> dict:
-    b64_data = base_draw(mol, width, height)
-    return {
-        "img_base64": b64_data,
-        "size": {
-            "width": width,
-            "height": height
-        }
-    }
 
 
 def get_most_hindered_indices(mol: Chem.Mol) -> list:
@@ -33,18 +21,18 @@ def get_most_hindered_indices(mol: Chem.Mol) -> list:
     return target_indices
 
 
-def generate_answer_coords(mol: Chem.Mol, width: int, height: int) -> list:
+def generate_answer_coords(mol: Chem.Mol, atom_coords: list, target_indices: list = None) -> list:
     """
     生成答案区域（围绕目标原子的小方框）
+    target_indices: 入库时预计算的目标原子 idx，缺省时现算
     """
-    target_indices = get_most_hindered_indices(mol)
+    if target_indices is None:
+        target_indices = get_most_hindered_indices(mol)
 
     valid_polygons = []
-    d2d = rdMolDraw2D.MolDraw2DCairo(width, height)
-    d2d.DrawMolecule(mol)
 
     for atom_idx in target_indices:
-        p = d2d.GetDrawCoords(atom_idx)
+        p = atom_coords[atom_idx]
         # 设定点击热区大小，半径 20 像素左右
         delta = 20
         polygon = point_to_s(p, delta)
@@ -1,7 +1,8 @@
 from .func import *
 from .db import *
 from app.captcha.base import BaseCaptcha
-from app.captcha.utils import get_random_line_by_table_name, get_mol_info_by_path, construct_rdkit, base_verify
+from app.captcha.features import MolFeatures
+from app.captcha.utils import get_random_line_by_table_name, get_mol_info_by_path, construct_rdkit, base_verify, draw_func
 from typing import Any
 
 
@@ -29,10 +30,14 @@ class StericCaptcha(BaseCaptcha):
         return db_init(self.table_name)
 
     def generate_img(self) -> dict:
-        return draw_func(self.rdkit_object, width=self.width, height=self.height)
+        return draw_func(self.get_render(), self.image_format)
 
     def generate_answer(self) -> list:
-        return generate_answer_coords(self.rdkit_object, width=self.width, height=self.height)
+        return generate_answer_coords(
+            self.rdkit_object,
+            atom_coords=self.get_render().atom_coords,
+            target_indices=self.get_answers().get("atoms")
+        )
 
     def generate_read_output(self) -> str:
         # 根据难度动态调整提示语，显得更专业
@@ -48,6 +53,6 @@ class StericCaptcha(BaseCaptcha):
         """
         return base_verify(user_input=user_input, answer_data=answer_data)
 
-    def get_metadata(self, mol: Chem.Mol) -> bool:
-        return get_mol_value(mol)
+    def get_metadata(self, mol: Chem.Mol, features: MolFeatures = None) -> bool:
+        return get_mol_value(mol, features)
 
@@ -1,15 +1,31 @@
-from typing import Any
+from typing import Any, Callable, List, Optional, Tuple
 from app.utils.logger import logger
-import app.utils.database as db
+from app.utils.catalog import get_catalog
 import base64
+import hashlib
+import json
+import struct
 import os
+import random
+import re
+import sys
+from array import array
 from app.utils.exceptions import CaptchaException, PluginException
 from rdkit import Chem
 import app.utils.config as config
 from app.utils.noise import NoiseUtils
+from app.utils.encoder import encode_image, get_format
+from PIL import Image
+import numpy as np
+import io
+from app.captcha.mol_cache import MolCache
+from app.captcha.hotspots import HotspotIndex, parse_clicks
+from app.captcha.smarts import smarts_registry
+from app.utils.pack import get_pack_reader
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 from Crypto.Random import get_random_bytes
+from rdkit.Chem import rdDepictor
 from rdkit.Chem.Draw import rdMolDraw2D
 
 def is_point_in_polygon(x, y, poly_coords):
@@ -34,8 +50,35 @@ def is_point_in_polygon(x, y, poly_coords):
 
     return inside
 
-def construct_rdkit(mol_path:str) -> Chem.Mol:
-    """解析mol文件，构造rdkit对象，不要单独使用！！"""
+def _has_usable_2d(mol: Chem.Mol) -> bool:
+    """有 2D 构象且坐标没有全部挤在一点"""
+    if mol.GetNumConformers() == 0:
+        return False
+    conformer = mol.GetConformer()
+    if conformer.Is3D():
+        return False
+    if mol.GetNumAtoms() < 2:
+        return True
+    positions = conformer.GetPositions()[:, :2]
+    return bool(np.ptp(positions, axis=0).max() > 1e-3)
+
+
+def prepare_depiction(mol: Chem.Mol) -> bool:
+    """
+    原地定好分子的 2D 排版 (入库时调用一次，结果随 ToBinary 存进打包文件)：
+    坐标不可用 (或 DEPICTION_RECOMPUTE) 时重算，再统一朝向和键长，保证各节点画出来一致
+    DrawMolecule 遇到现成的 2D 构象就不再排版
+    :return: 是否重算了坐标
+    """
+    recomputed = config.DEPICTION_RECOMPUTE or not _has_usable_2d(mol)
+    if recomputed:
+        rdDepictor.Compute2DCoords(mol, clearConfs=True)
+    if config.DEPICTION_CANON_ORIENT and mol.GetNumAtoms() > 1:
+        rdDepictor.NormalizeDepiction(mol)
+    return recomputed
+
+
+def _parse_mol_file(mol_path: str) -> Chem.Mol:
     if not os.path.exists(mol_path):
         logger.error(f"Mol file not found: {mol_path}")
         raise CaptchaException(f"Mol file not found: {mol_path}")
@@ -54,6 +97,8 @@ def construct_rdkit(mol_path:str) -> Chem.Mol:
             raise CaptchaException("RDKit failed to parse mol block")
 
         Chem.SanitizeMol(mol)
+        # 打包文件缺这个分子时才会走到这里，排版规则与入库一致
+        prepare_depiction(mol)
         return mol
 
     except Exception as e:
@@ -61,32 +106,261 @@ def construct_rdkit(mol_path:str) -> Chem.Mol:
         raise PluginException(f"Error parsing mol file {mol_path}: {e}")
 
 
+def mol_pack_key(mol_path: str) -> str:
+    """
+    分子打包文件的 key：相对 MOL_DIR 的路径 (默认目录下就是文件名)
+    入库和出题用的是库里同一个 path，不同目录下的同名文件 (1.mol ...) 不会互相覆盖
+    """
+    try:
+        key = os.path.relpath(os.path.abspath(mol_path), os.path.abspath(config.MOL_DIR))
+    except ValueError:  # Windows 下不在同一个盘
+        key = os.path.abspath(mol_path)
+    return key.replace(os.sep, "/")
+
+
+def _mol_blob(mol_path: str) -> Optional[memoryview]:
+    """分子打包文件里的 Mol.ToBinary，没有返回 None"""
+    pack = get_pack_reader(config.MOL_PACK_PATH)
+    if pack is None:
+        return None
+    key = mol_pack_key(mol_path)
+    if key not in pack:
+        pack.refresh(max_age=config.PACK_REFRESH_INTERVAL)  # 入库脚本可能刚追加；坏 path 不会每次都重读索引
+    return pack.get(key)
+
+
+def _load_mol(mol_path: str) -> Chem.Mol:
+    """优先从打包文件 (mmap) 解码，打包里没有再回退读单个 .mol 文件"""
+    blob = _mol_blob(mol_path)
+    if blob is not None:
+        # RDKit 只收 bytes，这里的一次拷贝省不掉 (其余用到 blob 的地方如算 key 都直接用 memoryview)
+        return Chem.Mol(bytes(blob))
+
+    return _parse_mol_file(mol_path)
+
+
+# 绘图参数变了 (字体、线宽等) 就改这里，旧的预渲染底图自然失效
+RENDER_VERSION = f"v2|{config.FONT_NAME}"
+
+
+def _digest(mol_blob: bytes, canvas_width: int, canvas_height: int, kind: str) -> str:
+    digest = hashlib.sha1(mol_blob)
+    digest.update(f"|{canvas_width}x{canvas_height}|{RENDER_VERSION}".encode("utf-8"))
+    if kind:
+        digest.update(f"|{kind}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def prerender_key(mol_blob: bytes, canvas_width: int, canvas_height: int, backend: str = "cairo") -> str:
+    """预渲染底图按内容寻址：分子二进制 + 画布尺寸 + 绘图参数版本 (+ 非默认的绘图后端)"""
+    return _digest(mol_blob, canvas_width, canvas_height, "" if backend == "cairo" else backend)
+
+
+def geometry_key(mol_blob: bytes, canvas_width: int, canvas_height: int) -> str:
+    """原子绘图坐标与后端无关，每个 (分子, 标准画布) 一条"""
+    return _digest(mol_blob, canvas_width, canvas_height, "geometry")
+
+
+def pack_geometry(atom_coords: list, canvas_width: int, canvas_height: int) -> bytes:
+    """原子坐标归一化到单位画布，float32 (x, y) x n"""
+    coords = np.asarray(atom_coords, dtype=np.float32).reshape(-1, 2) / np.float32((canvas_width, canvas_height))
+    return coords.astype(np.float32).tobytes()
+
+
+def unpack_geometry(blob: memoryview, canvas_width: int, canvas_height: int) -> list:
+    coords = np.frombuffer(blob, dtype=np.float32).reshape(-1, 2) * (canvas_width, canvas_height)
+    return [(float(x), float(y)) for x, y in coords]
+
+
+def _base_pack_get(mol_path: str, make_key: Callable[[bytes], str]) -> Optional[memoryview]:
+    if not config.PRERENDER_ENABLED:
+        return None
+    pack = get_pack_reader(config.BASE_PACK_PATH)
+    if pack is None:
+        return None
+    mol_blob = _mol_blob(mol_path)
+    if mol_blob is None:
+        return None
+
+    key = make_key(mol_blob)
+    blob = pack.get(key)
+    if blob is None:
+        pack.refresh(max_age=config.PACK_REFRESH_INTERVAL)
+        blob = pack.get(key)
+    return blob
+
+
+def load_geometry(mol_path: str, canvas_width: int, canvas_height: int) -> Optional[list]:
+    """查入库时存下的原子坐标 (画布坐标系)，没有返回 None"""
+    blob = _base_pack_get(mol_path, lambda mol_blob: geometry_key(mol_blob, canvas_width, canvas_height))
+    if blob is None:
+        return None
+    return unpack_geometry(blob, canvas_width, canvas_height)
+
+
+def load_prerendered(mol_path: str, canvas_width: int, canvas_height: int, backend: str = "cairo") -> Optional[bytes]:
+    """查预渲染的干净底图 (PNG/SVG)，没有返回 None"""
+    blob = _base_pack_get(mol_path, lambda mol_blob: prerender_key(mol_blob, canvas_width, canvas_height, backend))
+    if blob is None:
+        return None
+    return bytes(blob)
+
+
+mol_cache = MolCache(max_atoms=config.MOL_CACHE_MAX_ATOMS)
+
+
+def construct_rdkit(mol_path:str) -> Chem.Mol:
+    """解析mol文件，构造rdkit对象，不要单独使用！！  (走 LRU 缓存，返回的是可随意修改的副本)"""
+    return mol_cache.get(mol_path, lambda: _load_mol(mol_path))
+
+
 def get_random_line_by_table_name(table_name: str) -> Any:
-    """获取数据库中，随机的 相应验证码"""
-    return db.get_random_line(table_name)
+    """获取数据库中，随机的 相应验证码 (内存目录均匀抽样)"""
+    return get_catalog(table_name).sample()
 
 def get_mol_info_by_path(table_name: str, path: str ) -> Any:
     """从文件路径查询runtime前录入的信息"""
-    return db.get_mol_info_by_path(table_name, path)
+    return get_catalog(table_name).get_by_path(path)
 
 
-def base_draw(mol: Chem.Mol, width, height):
-    """点击区域类可使用，不适用于多次点击！！"""
+_DRAW_OPTIONS = None
+
+
+def get_draw_options() -> rdMolDraw2D.MolDrawOptions:
+    """绘图参数 (含字体查找) 只构造一次，所有 drawer 共用"""
+    global _DRAW_OPTIONS
+    if _DRAW_OPTIONS is None:
+        opts = rdMolDraw2D.MolDrawOptions()
+
+        opts.addAtomIndices = False
+        opts.clearBackground = False
+        if config.FONT_NAME != "":
+            font_path = os.path.join(config.FONT_DIR, config.FONT_NAME)
+            if os.path.exists(font_path):
+                opts.fontFile = font_path
+
+            opts.comicMode = True
+            opts.bondLineWidth = 2  # 加粗线条，干扰细线识别
+
+        _DRAW_OPTIONS = opts
+    return _DRAW_OPTIONS
+
+
+# 绘图后端：Cairo 出 PNG 再光栅加噪；SVG 直接出矢量图，干扰以 SVG 图元注入
+# 两者共用 get_draw_options() 和同样的标准画布，GetDrawCoords 完全一致，答案热区与后端无关
+RENDER_BACKENDS = {
+    "cairo": rdMolDraw2D.MolDraw2DCairo,
+    "svg": rdMolDraw2D.MolDraw2DSVG,
+}
+
+
+def render_backend(fmt: str) -> str:
+    """输出格式 -> 绘图后端"""
+    return "svg" if fmt == config.IMAGE_FORMAT_SVG else "cairo"
+
+
+def clamp_size(width: int, height: int) -> Tuple[int, int]:
+    """请求尺寸限制在 [CAPTCHA_MIN_SIZE, CAPTCHA_MAX_SIZE]，防止超大画布占满 CPU"""
+    min_w, min_h = config.CAPTCHA_MIN_SIZE
+    max_w, max_h = config.CAPTCHA_MAX_SIZE
+    return min(max(int(width), min_w), max_w), min(max(int(height), min_h), max_h)
+
+
+def canonical_size(width: int, height: int) -> Tuple[int, int]:
+    """能完整覆盖请求尺寸的最小标准画布 (缩小比放大清晰)，都不够就取最大的"""
+    sizes = sorted(config.CANONICAL_SIZES, key=lambda s: s[0] * s[1])
+    for canvas in sizes:
+        if canvas[0] >= width and canvas[1] >= height:
+            return canvas
+    return sizes[-1]
+
+
+class RenderResult:
+    """
+    一次 DrawMolecule 的全部产物：图片 + 每个原子的绘图坐标
+    出图和算答案热区都从这里取，不再重复绘制
 
-    d2d = rdMolDraw2D.MolDraw2DCairo(width, height)
-    # 不是形参，是self类型的注释！！！
+    分子只在少数标准画布 (canvas_width x canvas_height) 上绘制，再等比缩放、居中到请求尺寸 (width x height)。
+    atom_coords 和插件算出的热区都在标准画布坐标系，出图/发答案时统一经 transform 变换。
+    """
+    __slots__ = ("width", "height", "canvas_width", "canvas_height", "transform", "atom_coords", "backend",
+                 "_drawer", "_image", "_loader")
+
+    def __init__(self, atom_coords: list, width: int, height: int,
+                 canvas_width: int = None, canvas_height: int = None,
+                 drawer: rdMolDraw2D.MolDraw2D = None, image: bytes = None,
+                 loader: Callable[[], bytes] = None, backend: str = "cairo"):
+        """
+        drawer / image / loader 三选一：现场绘制的传 drawer，已有底图的传 image (PNG 或 SVG 字节)，
+        坐标来自入库几何的传 loader (第一次取图时才去查预渲染底图或绘制)
+        """
+        self.width = width
+        self.height = height
+        self.canvas_width = canvas_width or width
+        self.canvas_height = canvas_height or height
+
+        # 等比缩放 + 居中：(sx, sy, ox, oy)，缩放后尺寸取整，sx/sy 按取整后的尺寸算保证像素对齐
+        scale = min(width / self.canvas_width, height / self.canvas_height)
+        scaled_w = max(1, round(self.canvas_width * scale))
+        scaled_h = max(1, round(self.canvas_height * scale))
+        self.transform = (scaled_w / self.canvas_width, scaled_h / self.canvas_height,
+                          (width - scaled_w) // 2, (height - scaled_h) // 2)
+
+        self.atom_coords = atom_coords
+        self.backend = backend
+        self._drawer = drawer
+        self._image = image
+        self._loader = loader
+
+    @property
+    def scaled(self) -> bool:
+        return (self.width, self.height) != (self.canvas_width, self.canvas_height)
+
+    @property
+    def scale(self) -> float:
+        """热区半径等标量的缩放系数"""
+        return min(self.transform[0], self.transform[1])
+
+    def to_output(self, points: list) -> list:
+        """标准画布坐标 -> 请求尺寸下的坐标"""
+        if not self.scaled:
+            return points
+        sx, sy, ox, oy = self.transform
+        return [(x * sx + ox, y * sy + oy) for x, y in points]
+
+    def transform_polygons(self, polygons: list) -> list:
+        if not self.scaled:
+            return polygons
+        return [self.to_output(poly) for poly in polygons]
+
+    @property
+    def image(self) -> bytes:
+        """干净底图 (Cairo 为 PNG，SVG 后端为 SVG 文本)，推迟到第一次取图时，只要坐标的场景 (如 verify) 不必编码"""
+        if self._image is None:
+            if self._loader is not None:
+                self._image = self._loader()
+                self._loader = None
+            else:
+                self._image = drawing_bytes(self._drawer)
+                self._drawer = None
+        return self._image
+
+
+def drawing_bytes(d2d: rdMolDraw2D.MolDraw2D) -> bytes:
+    """drawer 的输出统一成字节 (SVG 后端给的是 str)"""
     # noinspection PyArgumentList
-    opts = d2d.drawOptions()
+    image = d2d.GetDrawingText()
+    return image.encode("utf-8") if isinstance(image, str) else image
 
-    opts.addAtomIndices = False
-    opts.clearBackground = False
-    if config.FONT_NAME != "":
-        font_path = os.path.join(config.FONT_DIR, config.FONT_NAME)
-        if os.path.exists(font_path):
-            opts.fontFile = font_path
 
-        opts.comicMode = True
-        opts.bondLineWidth = 2  # 加粗线条，干扰细线识别
+def draw_canvas(mol: Chem.Mol, canvas_width: int, canvas_height: int,
+                backend: str = "cairo") -> Tuple[rdMolDraw2D.MolDraw2D, list]:
+    """在标准画布上绘制一次，返回 drawer 与各原子的绘图坐标"""
+    drawer_class = RENDER_BACKENDS.get(backend)
+    if drawer_class is None:
+        raise CaptchaException(f"Unknown render backend: {backend}")
+    d2d = drawer_class(canvas_width, canvas_height)
+    d2d.SetDrawOptions(get_draw_options())
 
     d2d.DrawMolecule(mol)
 
@@ -94,15 +368,90 @@ def base_draw(mol: Chem.Mol, width, height):
     d2d.FinishDrawing()
 
     # noinspection PyArgumentList
-    raw_png_data = d2d.GetDrawingText()
+    atom_coords = [(p.x, p.y) for p in (d2d.GetDrawCoords(i) for i in range(mol.GetNumAtoms()))]
+    return d2d, atom_coords
+
+
+def render_mol(mol: Chem.Mol, width: int, height: int, mol_path: str = "", backend: str = "cairo") -> RenderResult:
+    """
+    单次绘制分子 (在标准画布上画，见 RenderResult)
+    传入 mol_path 时先查入库阶段存下的原子坐标：命中则答案热区直接由坐标算出，不碰 drawer；
+    底图推迟到真正出图时再查预渲染包，没有才绘制
+    """
+    canvas_width, canvas_height = canonical_size(width, height)
+
+    if mol_path:
+        atom_coords = load_geometry(mol_path, canvas_width, canvas_height)
+        if atom_coords is not None and len(atom_coords) == mol.GetNumAtoms():
+            def loader() -> bytes:
+                image = load_prerendered(mol_path, canvas_width, canvas_height, backend)
+                if image is None:
+                    image = drawing_bytes(draw_canvas(mol, canvas_width, canvas_height, backend)[0])
+                return image
+
+            return RenderResult(atom_coords, width, height, canvas_width, canvas_height,
+                                loader=loader, backend=backend)
+
+    d2d, atom_coords = draw_canvas(mol, canvas_width, canvas_height, backend)
+    return RenderResult(atom_coords, width, height, canvas_width, canvas_height, drawer=d2d, backend=backend)
+
+
+_SVG_BODY = re.compile(r"<!-- END OF HEADER -->\s*(.*?)\s*</svg>", re.S)
+_SVG_CLASS = re.compile(r" class='[^']*'")
+_SVG_ELEMENT = re.compile(r"\n(?=<)")
+
+
+def finish_svg(render: RenderResult) -> bytes:
+    """
+    SVG 后端出图：去掉 RDKit 头部和 class (其中带原子/键编号)，打乱元素顺序，
+    整体经 transform 缩放、居中到请求尺寸，最后叠加 SVG 干扰图元
+    """
+    svg = render.image.decode("utf-8")
+    match = _SVG_BODY.search(svg)
+    if match is None:
+        raise CaptchaException("Unexpected SVG output from RDKit")
+    elements = _SVG_ELEMENT.split(_SVG_CLASS.sub("", match.group(1)))
+    random.shuffle(elements)
+
+    sx, sy, ox, oy = render.transform
+    parts = [
+        f"<svg xmlns='http://www.w3.org/2000/svg' width='{render.width}' height='{render.height}' "
+        f"viewBox='0 0 {render.width} {render.height}'>",
+        f"<g transform='matrix({sx:.6g},0,0,{sy:.6g},{ox},{oy})'>" if render.scaled else "<g>",
+        *elements,
+        "</g>",
+    ]
     if config.NOISE_MODE:
-        png_data = NoiseUtils.add_interference(raw_png_data, density=3)
-    else:
-        png_data = raw_png_data
+        parts.extend(NoiseUtils.svg_interference(render.width, render.height, density=3))
+    parts.append("</svg>")
+    return "\n".join(parts).encode("utf-8")
 
-    img_base64 = base64.b64encode(png_data).decode('utf-8')
 
-    return img_base64
+def finish_img(render: RenderResult, fmt: str = "png") -> bytes:
+    """缩放到请求尺寸 + 加噪 + 编码为 fmt，返回最终的图片字节 (base64 与否由接口层决定)"""
+    if render.backend == "svg":
+        return finish_svg(render)
+
+    if not render.scaled and not config.NOISE_MODE and fmt == "png":
+        return render.image
+
+    image = Image.open(io.BytesIO(render.image)).convert("RGBA")
+    if render.scaled:
+        sx, sy, ox, oy = render.transform
+        size = (round(render.canvas_width * sx), round(render.canvas_height * sy))
+        canvas = Image.new("RGBA", (render.width, render.height))
+        canvas.paste(image.resize(size, Image.BILINEAR), (ox, oy))
+        image = canvas
+
+    pixels = np.array(image)
+    if config.NOISE_MODE:
+        NoiseUtils.add_interference_array(pixels, density=3)
+    return encode_image(pixels, fmt)
+
+
+def base_draw(mol: Chem.Mol, width, height):
+    """点击区域类可使用，不适用于多次点击！！"""
+    return finish_img(render_mol(mol, width, height))
 
 
 def base_verify(user_input: Any, answer_data: list):
@@ -110,38 +459,91 @@ def base_verify(user_input: Any, answer_data: list):
     验证逻辑：点击所有芳香环
     user_input: 前端传来的坐标列表，例如 [{"x": 100, "y": 200}, {"x": 300, "y": 400}]
     answer_data: generate_answer 返回的多边形列表
+    每个点击都必须落在某个热区里，且每个热区都至少被点中一次 (重合的热区只算一个)
     """
-    if not isinstance(user_input, list):
-        logger.warning("User input must be a list of coordinates for multi-select")
+    clicks = parse_clicks(user_input, config.VERIFY_MAX_CLICKS)
+    if clicks is None:
+        logger.warning(f"User input must be a list of at most {config.VERIFY_MAX_CLICKS} coordinates")
         return False
 
-    total_targets = len(answer_data)
-    hit_indices = set()
+    index = HotspotIndex(answer_data)
+    total_targets = len(index)
+    hit_clicks, hit_polygons = index.hits(clicks)
 
-    for click in user_input:
-        cx = float(click.get('x', -1))
-        cy = float(click.get('y', -1))
-
-        hit_any_this_click = False  # 这里的严格模式，可以使用captcha options去扩展，后面开分支写！！
-
-        for idx, polygon in enumerate(answer_data):
-            if is_point_in_polygon(cx, cy, polygon):
-                hit_indices.add(idx)
-                hit_any_this_click = True
-                # 这里不break，因为理论上两个环可能重叠（稠环），点一下可能选中两个
-
-        if not hit_any_this_click:
-            logger.info(f"Verify Failed: Click at ({cx}, {cy}) missed all targets.")
-            return False
+    missed = np.setdiff1d(np.arange(len(clicks)), hit_clicks)
+    if missed.size:
+        cx, cy = clicks[missed[0]]
+        logger.info(f"Verify Failed: Click at ({cx}, {cy}) missed all targets.")
+        return False
 
-    if len(hit_indices) == total_targets:
+    found = np.unique(hit_polygons).size
+    if found == total_targets:
         logger.info(f"Verify Success: All {total_targets} rings found.")
         return True
     else:
-        logger.info(f"Verify Failed: Found {len(hit_indices)}/{total_targets} rings.")
+        logger.info(f"Verify Failed: Found {found}/{total_targets} rings.")
         return False
 
 
+# token 内答案几何的定点精度：1/4 像素，int16 可覆盖 ±8191 px
+PACK_SCALE = 4
+
+
+def _to_int16(values: List[float]) -> array:
+    buf = array('h', (max(-32768, min(32767, round(v * PACK_SCALE))) for v in values))
+    if sys.byteorder == 'big':
+        buf.byteswap()
+    return buf
+
+
+def _from_int16(data: str) -> array:
+    buf = array('h')
+    buf.frombytes(base64.b64decode(data))
+    if sys.byteorder == 'big':
+        buf.byteswap()
+    return buf
+
+
+def pack_points(points: List[Tuple[float, float]]) -> str:
+    """坐标点列表 -> 量化后的 int16 (x, y, x, y ...) base64"""
+    flat = []
+    for x, y in points:
+        flat.append(x)
+        flat.append(y)
+    return base64.b64encode(_to_int16(flat).tobytes()).decode('ascii')
+
+
+def unpack_points(data: str) -> List[Tuple[float, float]]:
+    buf = _from_int16(data)
+    return [(buf[i] / PACK_SCALE, buf[i + 1] / PACK_SCALE) for i in range(0, len(buf), 2)]
+
+
+def pack_polygons(polygons: list) -> str:
+    """
+    多边形列表压成 int16 序列：[顶点数, x0, y0, x1, y1, ..., 顶点数, ...]
+    顶点数也按 PACK_SCALE 放大存储，省得拆两种类型
+    """
+    flat = []
+    for polygon in polygons:
+        flat.append(len(polygon))
+        for x, y in polygon:
+            flat.append(x)
+            flat.append(y)
+    return base64.b64encode(_to_int16(flat).tobytes()).decode('ascii')
+
+
+def unpack_polygons(data: str) -> list:
+    buf = _from_int16(data)
+    polygons = []
+    i = 0
+    while i < len(buf):
+        n = buf[i] // PACK_SCALE
+        i += 1
+        polygons.append([(buf[i + 2 * k] / PACK_SCALE, buf[i + 2 * k + 1] / PACK_SCALE) for k in range(n)])
+        i += 2 * n
+    return polygons
+
+
 def aes_cbc_encrypt(text: str, key: bytes) -> str:
     """AES加密"""
     key_bytes = key
@@ -166,42 +568,86 @@ def aes_cbc_decrypt(encrypted_text: str, key: bytes) -> str:
     return data.decode('utf-8')
 
 
+def aes_gcm_encrypt(text: str, key: bytes, block: int = 0) -> str:
+    """
+    AES-GCM 加密 (带认证，密文被改动解密即失败)
+    block > 0 时明文用空格补齐到 block 的整数倍，密文长度不再透露内容长短
+    """
+    data_bytes = text.encode('utf-8')
+    if block > 0:
+        data_bytes += b" " * (-len(data_bytes) % block)
+    nonce = get_random_bytes(12)
+
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    ciphertext, tag = cipher.encrypt_and_digest(data_bytes)
+    return base64.b64encode(nonce + ciphertext + tag).decode('utf-8')
+
+
+def aes_gcm_decrypt(encrypted_text: str, key: bytes) -> str:
+    """AES-GCM 解密并校验，失败抛 ValueError；补齐的空格原样保留 (明文是 JSON，不影响解析)"""
+    combined_data = base64.b64decode(encrypted_text)
+    nonce, ciphertext, tag = combined_data[:12], combined_data[12:-16], combined_data[-16:]
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    return cipher.decrypt_and_verify(ciphertext, tag).decode('utf-8')
+
+
 def point_to_s(p, delta):
     """点计算点击热区"""
+    x, y = p
     return [
-        (p.x - delta, p.y - delta),
-        (p.x + delta, p.y - delta),
-        (p.x + delta, p.y + delta),
-        (p.x - delta, p.y + delta)
+        (x - delta, y - delta),
+        (x + delta, y - delta),
+        (x + delta, y + delta),
+        (x - delta, y + delta)
     ]
 
 
-def draw_func(mol: Chem.rdchem.Mol, width: int, height: int) -> dict:
-    b64_data = base_draw(mol, width, height)
+def draw_func(render: RenderResult, fmt: str = "png") -> dict:
     return {
-        "img_base64": b64_data,
+        "img_bytes": finish_img(render, fmt),
+        "media_type": get_format(fmt).media_type,
+        "format": fmt,
         "size": {
-            "width": width,
-            "height": height
+            "width": render.width,
+            "height": render.height
         }
     }
 
 
-def generate_answer_coords(mol: Chem.Mol, width: int, height: int, target_smarts: str, delta: int = 20) -> list:
-    pattern = Chem.MolFromSmarts(target_smarts)
-    matches = mol.GetSubstructMatches(pattern)
+def dump_answers(answers: dict) -> str:
+    """入库用：各题型变体的答案 (原子/键 idx) -> answer_json"""
+    return json.dumps(answers, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_answers(mol_info: Any) -> dict:
+    """读取入库时预计算的答案；旧库没有 answer_json 列时返回空字典，调用方回退现算"""
+    raw = (mol_info or {}).get("answer_json")
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logger.warning(f"Broken answer_json: {raw[:50]}")
+        return {}
+
+
+def smarts_matches(mol: Chem.Mol, smarts: str) -> list:
+    """SMARTS 的全部匹配，转成可 json 化的 list (模式由全局注册表编译一次)"""
+    return smarts_registry.matches(mol, smarts)
+
+
+def generate_answer_coords(mol: Chem.Mol, atom_coords: list, target_smarts: str, delta: int = 20,
+                           matches: list = None) -> list:
+    """matches: 入库时预计算的匹配结果，缺省时现算"""
+    if matches is None:
+        matches = smarts_matches(mol, target_smarts)
 
     valid_polygons = []
-    d2d = rdMolDraw2D.MolDraw2DCairo(width, height)
-    d2d.DrawMolecule(mol)
 
     for match_indices in matches:
 
         for atom_idx in match_indices:
-            p = d2d.GetDrawCoords(atom_idx)
-
-            polygon = point_to_s(p, delta)
+            polygon = point_to_s(atom_coords[atom_idx], delta)
             valid_polygons.append(polygon)
 
     return valid_polygons
-
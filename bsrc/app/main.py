@@ -1,12 +1,17 @@
 import uvicorn
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.utils.logger import logger
-from app.web.router import router as captcha_router
+from app.web.router import router as captcha_router, captcha_pool, render_workers, loop_monitor, verify_executor
+from app.captcha.plugins import PLUGINS
+from app.utils.catalog import load_catalogs
+from app.utils.database import restore_deferred_indexes
+from app.utils.noise import load_noise_libraries
 from app.utils import config
 from app.utils.config import DIST_DIR
 import mimetypes
@@ -16,11 +21,33 @@ import mimetypes
 mimetypes.add_type("text/css", ".css")
 mimetypes.add_type("application/javascript", ".js")
 
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    try:
+        restore_deferred_indexes()  # 批量入库被中途杀掉时留下的缺索引
+    except Exception as e:
+        logger.error(f"Failed to restore deferred indexes: {e}")
+    if config.WORKER_PROCESSES <= 0:
+        # 没有渲染子进程时由主进程出图；有子进程时它们各自加载 (干扰层库落盘是原子替换，并发生成也安全)
+        load_catalogs([plugin.table_name for plugin in PLUGINS.values()])
+        load_noise_libraries(config.POOL_SIZES)
+    render_workers.start()
+    loop_monitor.start()
+    if config.POOL_ENABLED:
+        captcha_pool.start()
+    yield
+    captcha_pool.stop()
+    render_workers.stop()
+    verify_executor.shutdown(wait=False)
+    await loop_monitor.stop()
+
+
 def create_app() -> FastAPI:
     my_app = FastAPI(
         title="ChemCaptcha Service",
         description="A dynamic, plugin-based chemical captcha service.",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
     )
 
     my_app.add_middleware(
@@ -0,0 +1,317 @@
+"""
+插件表的内存目录：
+启动时只把每张插件表的 id、path 和数值特征列 (如 carbon_count / chiral_count / hbd_count) 读成定长 numpy 数组，
+随机抽题和按特征筛选都是数组操作，且不再受 id 空洞影响 (旧的 MAX(id) + WHERE id >= ? 会偏向空洞后面的 id)。
+answer_json 等文本/JSON 列不常驻内存 (父进程和每个渲染子进程各有一份目录)，抽中哪行再按主键取整行。
+新数据入库后按 id 增量追加；已有行被删除或原地更新则整表重载。
+刷新到期后由后台线程执行，读者继续用旧快照，刷新完成后整体替换；刷新出错只记日志，继续用旧快照。
+"""
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import app.utils.config as config
+from app.utils.database import connect_readonly, read_conn
+from app.utils.exceptions import DataBaseException
+from app.utils.logger import logger
+
+
+def _numeric_columns(conn: sqlite3.Connection, table_name: str) -> Dict[str, type]:
+    """按声明类型挑出数值特征列：INT/BOOL -> 整数，REAL/FLOA/DOUB/NUMERIC -> 浮点 (id 单独处理)"""
+    columns = {}
+    for row in conn.execute(f"PRAGMA table_info({table_name})"):
+        name, decl = row[1], (row[2] or "").upper()
+        if name == "id":
+            continue
+        if "INT" in decl or "BOOL" in decl:
+            columns[name] = np.int64
+        elif any(t in decl for t in ("REAL", "FLOA", "DOUB", "NUMERIC")):
+            columns[name] = np.float64
+    return columns
+
+
+def _to_array(values: list, dtype: type) -> np.ndarray:
+    """整数列能放进 int32 就用 int32；有 NULL 的列转成 float64 (NULL -> NaN)"""
+    if any(v is None for v in values):
+        return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+    array = np.asarray(values, dtype=dtype)
+    if dtype is np.int64 and array.size and -2**31 <= array.min() and array.max() < 2**31:
+        return array.astype(np.int32)
+    return array
+
+
+def _concat(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    if old.dtype != new.dtype:
+        dtype = np.result_type(old.dtype, new.dtype)
+        old, new = old.astype(dtype), new.astype(dtype)
+    return np.concatenate([old, new])
+
+
+class _Snapshot:
+    """不可变快照，刷新时整体替换引用，读者无需加锁"""
+    __slots__ = ("ids", "columns", "sorted_paths", "path_order", "size", "max_id")
+
+    def __init__(self, ids: np.ndarray, columns: Dict[str, np.ndarray], paths: np.ndarray):
+        self.ids = ids
+        self.columns = columns
+        self.size = len(ids)
+        self.max_id = int(ids[-1]) if self.size else 0
+        # path 按 utf-8 字节排序存放，按 path 查行用二分；同一 path 多行时取最后入库的 (稳定排序)
+        self.path_order = np.argsort(paths, kind="stable")
+        self.sorted_paths = paths[self.path_order]
+
+    def paths(self) -> np.ndarray:
+        """还原为行顺序的 path (增量追加时用)"""
+        paths = np.empty_like(self.sorted_paths)
+        paths[self.path_order] = self.sorted_paths
+        return paths
+
+    def find_path(self, path: str) -> Optional[int]:
+        key = np.bytes_(path.encode("utf-8"))
+        i = int(np.searchsorted(self.sorted_paths, key, side="right")) - 1
+        if i < 0 or self.sorted_paths[i] != key:
+            return None
+        return int(self.path_order[i])
+
+    def sums(self) -> Dict[str, float]:
+        """各数值列 (含 id) 的总和，与库里同样范围的 TOTAL() 对比，判断已有行是否被改过"""
+        sums = {"id": float(self.ids.sum())}
+        for name, column in self.columns.items():
+            sums[name] = float(np.nansum(column))
+        return sums
+
+    @property
+    def nbytes(self) -> int:
+        return (self.ids.nbytes + self.sorted_paths.nbytes + self.path_order.nbytes
+                + sum(column.nbytes for column in self.columns.values()))
+
+
+class MolCatalog:
+    def __init__(self, table_name: str, refresh_interval: float = 30.0, db_path: str = None):
+        self.table_name = table_name
+        self.refresh_interval = refresh_interval
+        self.db_path = db_path or config.MOL_DB_PATH
+        self._snapshot: Optional[_Snapshot] = None
+        self._numeric: Dict[str, type] = {}
+        self._lock = threading.Lock()
+        self._pending = threading.Lock()  # 同一时间只有一个后台刷新
+        self._last_refresh = 0.0
+        # 常驻连接上的 PRAGMA data_version：其它连接提交过写入它才会变，没变就不必查表
+        self._version_conn: Optional[sqlite3.Connection] = None
+        self._version_pid = 0
+        self._data_version: Optional[int] = None
+        self.reloads = 0
+        self.increments = 0
+        self.errors = 0
+
+    def _read_data_version(self) -> int:
+        if self._version_conn is None or self._version_pid != os.getpid():
+            self._version_conn = connect_readonly(self.db_path, config.DB_IMMUTABLE)
+            self._version_pid = os.getpid()
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _fetch(self, where: str = "", params: tuple = ()) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray]:
+        """只取 id、path 和数值特征列"""
+        with read_conn(self.db_path) as conn:
+            if not self._numeric:
+                self._numeric = _numeric_columns(conn, self.table_name)
+            names = ["id", "path"] + list(self._numeric)
+            rows = conn.execute(f"SELECT {', '.join(names)} FROM {self.table_name} {where} ORDER BY id",
+                                params).fetchall()
+
+        ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+        paths = np.asarray([(row[1] or "").encode("utf-8") for row in rows], dtype=np.bytes_)
+        if not rows:
+            paths = np.asarray([], dtype="S1")
+        columns = {name: _to_array([row[i + 2] for row in rows], dtype)
+                   for i, (name, dtype) in enumerate(self._numeric.items())}
+        return ids, columns, paths
+
+    def load(self):
+        """整表加载"""
+        self._numeric = {}  # 表结构可能变了 (补列)
+        ids, columns, paths = self._fetch()
+        self._snapshot = _Snapshot(ids, columns, paths)
+        self._last_refresh = time.time()
+        self.reloads += 1
+        logger.info(f"Catalog {self.table_name}: loaded {len(ids)} rows")
+
+    def _unchanged(self, conn: sqlite3.Connection, snap: _Snapshot) -> bool:
+        """快照范围内 (id <= max_id) 的行数和各数值列总和与库里一致，视为没有删除/原地更新"""
+        names = ["id"] + list(snap.columns)
+        row = conn.execute(
+            f"SELECT COUNT(*), {', '.join(f'TOTAL({name})' for name in names)} FROM {self.table_name} WHERE id <= ?",
+            (snap.max_id,)).fetchone()
+        if row[0] != snap.size:
+            return False
+        sums = snap.sums()
+        return all(math.isclose(row[i + 1], sums[name], rel_tol=1e-12, abs_tol=1e-9) for i, name in enumerate(names))
+
+    def refresh(self):
+        """
+        data_version 没变直接返回；变了先确认已有行没被删/改 (行数 + 数值列总和)，
+        是则按 id 增量追加，否则整表重载
+        """
+        with self._lock:
+            version = self._read_data_version()
+            snap = self._snapshot
+            if snap is None:
+                self.load()
+                self._data_version = version
+                return
+
+            if version == self._data_version:
+                self._last_refresh = time.time()
+                return
+
+            with read_conn(self.db_path) as conn:
+                unchanged = self._unchanged(conn, snap)
+            if not unchanged:
+                self.load()
+                self._data_version = version
+                return
+
+            ids, columns, paths = self._fetch("WHERE id > ?", (snap.max_id,))
+            if len(ids):
+                merged = {name: _concat(snap.columns[name], columns[name]) for name in snap.columns}
+                self._snapshot = _Snapshot(_concat(snap.ids, ids), merged, _concat(snap.paths(), paths))
+                self.increments += 1
+                logger.debug(f"Catalog {self.table_name}: +{len(ids)} rows")
+            self._data_version = version
+            self._last_refresh = time.time()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            self.errors += 1
+            self._last_refresh = time.time()  # 出错也等一个周期再试
+            logger.error(f"Catalog {self.table_name} refresh failed, serving stale snapshot: {e}")
+        finally:
+            self._pending.release()
+
+    def _current(self) -> Optional[_Snapshot]:
+        """当前快照；到期时交给后台线程刷新，本次请求不等。首次加载失败返回 None"""
+        snap = self._snapshot
+        if snap is None:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Catalog {self.table_name} load failed: {e}")
+                return None
+            return self._snapshot
+
+        if time.time() - self._last_refresh > self.refresh_interval and self._pending.acquire(blocking=False):
+            threading.Thread(target=self._background_refresh, name=f"catalog-{self.table_name}",
+                             daemon=True).start()
+        return snap
+
+    def _row(self, row_id: int) -> Optional[Dict[str, Any]]:
+        """整行 (含 answer_json 等文本列) 按主键现取"""
+        try:
+            with read_conn(self.db_path) as conn:
+                result = conn.execute(f"SELECT * FROM {self.table_name} WHERE id = ?", (row_id,)).fetchone()
+            return dict(result) if result else None
+        except Exception as e:
+            logger.error(f"Error getting row {row_id} from {self.table_name}: {e}")
+            return None
+
+    def filter(self, **ranges: Tuple[Optional[float], Optional[float]]) -> np.ndarray:
+        """
+        按数值特征向量化筛选，如 filter(carbon_count=(8, None), chiral_count=(2, 4))
+        每个区间两端都是闭区间，None 表示不限
+        :return: 满足全部条件的行下标 (交给 sample(indices=...))
+        """
+        snap = self._current()
+        if snap is None:
+            return np.empty(0, dtype=np.int64)
+
+        mask = np.ones(snap.size, dtype=bool)
+        for name, (lo, hi) in ranges.items():
+            column = snap.columns.get(name)
+            if column is None:
+                raise DataBaseException(f"{self.table_name} has no numeric column {name}")
+            if lo is not None:
+                mask &= column >= lo
+            if hi is not None:
+                mask &= column <= hi
+        return np.flatnonzero(mask)
+
+    def sample(self, indices: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """
+        均匀随机取一行
+        :param indices: filter() 的结果，只在这些行里抽；为空时返回 None
+        """
+        snap = self._current()
+        if snap is None:
+            return None
+        if indices is not None:
+            indices = indices[indices < snap.size]  # 期间整表重载过，丢掉越界的下标
+            if not len(indices):
+                return None
+        elif not snap.size:
+            logger.warning(f"Table {self.table_name} seems empty.")
+            return None
+
+        count = len(indices) if indices is not None else snap.size
+        for _ in range(3):  # 抽中的行刚被删掉时重抽
+            i = random.randrange(count)
+            row = self._row(int(snap.ids[indices[i] if indices is not None else i]))
+            if row is not None:
+                return row
+        return None
+
+    def get_by_path(self, path: str) -> Optional[Dict[str, Any]]:
+        snap = self._current()
+        if snap is None:
+            return None
+        i = snap.find_path(path)
+        return self._row(int(snap.ids[i])) if i is not None else None
+
+    def __len__(self) -> int:
+        snap = self._current()
+        return snap.size if snap else 0
+
+    def stats(self) -> dict:
+        snap = self._snapshot
+        return {
+            "rows": snap.size if snap else 0,
+            "max_id": snap.max_id if snap else 0,
+            "bytes": snap.nbytes if snap else 0,
+            "reloads": self.reloads,
+            "increments": self.increments,
+            "errors": self.errors,
+        }
+
+
+_catalogs: Dict[str, MolCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(table_name: str) -> MolCatalog:
+    catalog = _catalogs.get(table_name)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(table_name)
+            if catalog is None:
+                catalog = MolCatalog(table_name, refresh_interval=config.CATALOG_REFRESH_INTERVAL)
+                _catalogs[table_name] = catalog
+    return catalog
+
+
+def load_catalogs(table_names: List[str]):
+    """启动时预加载，首个请求不必等整表读取"""
+    for table_name in table_names:
+        try:
+            get_catalog(table_name).refresh()
+        except Exception as e:
+            logger.error(f"Failed to load catalog {table_name}: {e}")
+
+
+def catalog_stats() -> dict:
+    return {name: catalog.stats() for name, catalog in _catalogs.items()}
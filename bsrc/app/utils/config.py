@@ -7,6 +7,7 @@ load_dotenv()
 # 设置
 NOISE_MODE = True  # 启用噪声模式
 DEV_MOD = True   # 开发模式，demo路由的注册
+STATS_ENDPOINT = DEV_MOD  # /captcha/stats 会暴露池、缓存、数据库内部信息，默认随开发模式
 
 # AES加解密  不需要环境变量，只是略微增加前端逆向难度
 # 不要用这么蠢的密码！！
@@ -19,10 +20,12 @@ if not TOKEN_AES_KEY:
 
     env_file = os.path.join("..", ".env")
     set_key(env_file, "AES_KEY", generated_key)
+    os.environ["AES_KEY"] = generated_key  # 渲染子进程 (spawn) 继承同一密钥
 
     TOKEN_AES_KEY = generated_key
 
 TOKEN_AES_KEY = TOKEN_AES_KEY.encode("utf-8")
+TOKEN_PAD_BLOCK = 512  # token 明文补齐的块大小 (字节)，密文长度不随答案大小变化
 
 
 FONT_NAME = "ComicNeue-Bold.ttf" # 不启用则留空
@@ -31,9 +34,46 @@ FONT_NAME = "ComicNeue-Bold.ttf" # 不启用则留空
 DEFAULT_WIDTH = 800
 DEFAULT_HEIGHT = 600
 
+# 标准画布：分子只在这几个尺寸上绘制，再等比缩放到请求尺寸 (热区同一变换)
+CANONICAL_SIZES = [(400, 300), (DEFAULT_WIDTH, DEFAULT_HEIGHT), (1200, 900)]
+CAPTCHA_MIN_SIZE = (200, 150)   # 请求尺寸下限
+CAPTCHA_MAX_SIZE = (1600, 1200) # 请求尺寸上限
+
 # 有效期  // 2 min
 EXPIRED_TIME = 120
 
+# 图片交付方式：base64 (内嵌在 generate 的 JSON 里) / binary (generate 只返回 image_id，图片走单独接口)
+IMAGE_DELIVERY = "base64"
+IMAGE_STORE_MAX_MB = 256  # binary 模式下内存暂存区上限，图片保留 EXPIRED_TIME 秒
+
+# 图片输出格式：png / png_fast / png_palette / webp / webp_lossless / svg (取舍见 scripts/bench_formats.py)
+# 请求可用 ?format= 指定；未指定且 Accept 声明支持 image/webp 时用 IMAGE_FORMAT_WEBP
+# svg 走 MolDraw2DSVG 后端，不经 Cairo 光栅化，干扰以 SVG 图元注入 (对比见 scripts/bench_backends.py)
+IMAGE_FORMAT = "png"
+IMAGE_FORMAT_WEBP = "webp"
+IMAGE_FORMAT_SVG = "svg"
+PNG_FAST_COMPRESS_LEVEL = 1
+PNG_PALETTE_COLORS = 256
+WEBP_QUALITY = 80          # 有损质量
+WEBP_LOSSLESS_EFFORT = 30  # 无损压缩力度 (0-100)
+WEBP_METHOD = 4            # 编码速度/体积取舍 (0 快 - 6 小)
+
+# 预渲染池：后台提前生成验证码，接口直接出池
+POOL_ENABLED = True
+POOL_SIZES = [(DEFAULT_WIDTH, DEFAULT_HEIGHT)]  # 预渲染的常用尺寸
+POOL_CAPACITY = 16     # 每个 (插件, 尺寸) 队列的上限
+
+# 渲染进程池：生成在子进程里跑，不阻塞事件循环 (0 表示改用线程池)
+WORKER_PROCESSES = 2
+WORKER_STATS_INTERVAL = 1.0  # 子进程随任务结果上报进程内计数的最短间隔 (秒)
+LOOP_LAG_INTERVAL = 0.5  # 事件循环延迟的采样间隔 (秒)
+VERIFY_THREADS = 4  # 验证的独立线程池，不与渲染排队
+
+# 干扰层预计算库：常用尺寸 (POOL_SIZES) 启动时生成或从磁盘加载
+NOISE_LIBRARY_ENABLED = True
+NOISE_LIBRARY_SIZE = 2000   # 每个尺寸的层数
+NOISE_LIBRARY_MAX_MB = 64   # 每个尺寸的内存上限，先到先停
+
 # 路径配置
 CURRENT_DIR = os.path.dirname(__file__)
 MOL_DIR = os.path.join(CURRENT_DIR, "..", "..", "data", "mol")
@@ -43,6 +83,49 @@ LOG_PATH = os.path.join(CURRENT_DIR, "..", "..", "data", "log")
 MOL_DB_PATH = os.path.join(DATABASE_DIR, "mol.db")
 FONT_DIR = os.path.join(CURRENT_DIR, "..", "..", "data", "fonts")
 DIST_DIR = os.path.join(CURRENT_DIR, "..", "static")
+PACK_DIR = os.path.join(CURRENT_DIR, "..", "..", "data", "pack")
+MOL_PACK_PATH = os.path.join(PACK_DIR, "mol.pack")  # 入库时写入的分子打包文件 (Mol.ToBinary)，key 见 mol_pack_key
+BASE_PACK_PATH = os.path.join(PACK_DIR, "base.pack")  # 预渲染底图 (干净 PNG + 归一化原子坐标)，按内容寻址
+NOISE_LIBRARY_DIR = os.path.join(CURRENT_DIR, "..", "..", "data", "noise")
+PACK_REFRESH_INTERVAL = 5.0  # 打包文件查不到 key 时重读索引的最短间隔 (秒)
+
+# SQLite 只读连接池 (runtime)
+DB_POOL_SIZE = 8
+DB_IMMUTABLE = False   # 服务期间确定不会再跑 init_sqlite 写库时可开启，跳过文件锁
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_CACHE_SIZE_KB = 64 * 1024
+DB_STATEMENT_CACHE = 256
+
+# 解析后分子的 LRU 缓存预算 (原子总数)
+MOL_CACHE_MAX_ATOMS = 500_000
+
+# 插件表内存目录：增量刷新间隔 (秒)
+CATALOG_REFRESH_INTERVAL = 30
+
+# 入库分类 (scripts.init_sqlite)：子进程数 (0 为串行) 与每批分子数，一批一个写事务
+INGEST_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+INGEST_CHUNK_SIZE = 64
+# 批量装载：入库期间放宽落盘 (synchronous=OFF)，写入的表的二级索引先删后建，最后 ANALYZE
+# 中途崩溃最多丢掉最近几批；删掉的索引 DDL 记在库里，下次入库或服务启动时补回
+INGEST_BULK_LOAD = True
+INGEST_CACHE_SIZE_KB = 256 * 1024
+
+# 最长碳链搜索的时间上限 (秒)，超时的分子在入库时跳过
+CHAIN_TIME_BUDGET = 2.0
+
+# 热区判定 (app.captcha.hotspots)：网格边长 (px)，一次验证最多接受的点击数 (碳链在此基础上再加最长链的长度)
+VERIFY_GRID_CELL = 64
+VERIFY_MAX_CLICKS = 64
+
+# 预渲染底图：入库后为每个分子在 CANONICAL_SIZES 上各画一次，出图时直接查表
+PRERENDER_ENABLED = True
+PRERENDER_AT_INGEST = True  # init_sqlite 分类完成后顺带执行 scripts.prerender
+PRERENDER_BACKENDS = ["cairo", "svg"]  # 需要预渲染的绘图后端
+
+# 2D 排版：入库时定好每个分子的 2D 坐标并随 Mol.ToBinary 进打包文件，出图时直接用
+# 文件坐标缺失/为 3D/退化时用 Compute2DCoords 重算；DEPICTION_RECOMPUTE 为 True 时一律重算
+DEPICTION_RECOMPUTE = False
+DEPICTION_CANON_ORIENT = True  # 主轴对齐到 X 轴并按 RDKit 标准键长缩放 (NormalizeDepiction)
 
 # 日志等级
 TERMINAL_LOG_LEVEL = "INFO"
@@ -1,5 +1,9 @@
+import os
+import queue
 import sqlite3
-import random
+import threading
+import time
+from urllib.request import pathname2url
 import app.utils.config as config
 from app.utils.exceptions import DataBaseException
 from app.utils.logger import logger
@@ -24,6 +28,165 @@ def get_conn(db_file):
     finally:
         conn.close()
 
+def connect_readonly(db_path: str, immutable: bool = False) -> sqlite3.Connection:
+    """只读连接 (连接池和需要常驻连接的调用方共用)"""
+    if not os.path.exists(db_path):
+        raise DataBaseException(f"Database not found: {db_path}")
+
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"  # 库文件在服务期间不会再变，跳过文件锁
+
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                           cached_statements=config.DB_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size=-{int(config.DB_CACHE_SIZE_KB)}")
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+class ConnectionPool:
+    """
+    只读连接池：runtime 只读不写，连接常驻复用，省掉每次查询的 connect/close
+    连接按需创建，上限 size；fork 出来的子进程 (worker) 会重建自己的连接
+    """
+
+    def __init__(self, db_path: str, size: int = 8, immutable: bool = False, timeout: float = 5.0):
+        self.db_path = db_path
+        self.size = size
+        self.immutable = immutable
+        self.timeout = timeout
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect_readonly(self.db_path, self.immutable)
+
+    def _checkout(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise DataBaseException(f"Timed out waiting for a connection to {self.db_path}")
+
+    @contextmanager
+    def connection(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+        start = time.perf_counter()
+        conn = self._checkout()
+        wait = time.perf_counter() - start
+
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": self._created,
+                "idle": self._idle.qsize(),
+                "size": self.size,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 4) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 4),
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = None) -> ConnectionPool:
+    target_path = db_path or getattr(config, 'MOL_DB_PATH', None)
+    if not target_path:
+        raise DataBaseException("❌ Database path is None! Please check app/utils/config.py")
+
+    pool = _pools.get(target_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(target_path)
+            if pool is None:
+                pool = ConnectionPool(target_path, size=config.DB_POOL_SIZE, immutable=config.DB_IMMUTABLE)
+                _pools[target_path] = pool
+    return pool
+
+
+@contextmanager
+def read_conn(db_path: str = None):
+    """只读查询走连接池"""
+    with get_pool(db_path).connection() as conn:
+        yield conn
+
+
+def pool_stats() -> dict:
+    return {os.path.basename(path): pool.stats() for path, pool in _pools.items()}
+
+
+def enable_wal(db_path: str = config.MOL_DB_PATH):
+    """WAL 是持久化到库文件里的，建表时设置一次即可；读写互不阻塞"""
+    with get_conn(db_path) as conn:
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        logger.debug(f"journal_mode={mode}")
+
+
+def ensure_column(table_name: str, column: str, decl: str, db_path: str = config.MOL_DB_PATH):
+    """给旧库补列 (CREATE TABLE IF NOT EXISTS 不会改已有表)"""
+    with get_conn(db_path) as conn:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {decl}")
+            conn.commit()
+            logger.info(f"Added column {column} to {table_name}")
+
+
 def insert_mol_database(table_name, data_source: Union[Dict, List[Dict]] = None, **kwargs):
     if data_source is None:
         if not kwargs:
@@ -67,39 +230,211 @@ def insert_mol_database(table_name, data_source: Union[Dict, List[Dict]] = None,
 
     except Exception as e:
         logger.error(f"存入mol数据库发生异常: {str(e)}")
-        # raise DataBaseException(f"Exception when inserting {table_name}: {e}")
+        raise DataBaseException(f"Exception when inserting {table_name}: {e}")
 
 
-def get_random_line(table_name: str) -> Optional[Dict[str, Any]]:
-    data = None
+DEFERRED_INDEX_TABLE = "_deferred_indexes"
+
+
+def _ensure_deferred_index_table(conn: sqlite3.Connection):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {DEFERRED_INDEX_TABLE} "
+                 f"(name TEXT PRIMARY KEY, tbl_name TEXT NOT NULL, sql TEXT NOT NULL, pid INTEGER NOT NULL)")
+
+
+def _pid_alive(pid: int) -> bool:
     try:
-        with get_conn(config.MOL_DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
 
-            cursor.execute(f"SELECT MAX(id) FROM {table_name}")  # 我也是写出拼接查询语句了！！ SQLi!!!
-            row = cursor.fetchone()
-            max_id = row[0] if row else 0
 
-            if max_id and max_id > 0:
-                rand_id = random.randint(1, max_id)
+def _create_indexes(conn: sqlite3.Connection, indexes: List[tuple]):
+    """按记下的 DDL 重建 (已存在的跳过)，并从 _deferred_indexes 里删掉；调用方负责事务"""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    for name, sql in indexes:
+        if name not in existing:
+            conn.execute(sql)
+    conn.executemany(f"DELETE FROM {DEFERRED_INDEX_TABLE} WHERE name = ?", [(name,) for name, _ in indexes])
 
-                cursor.execute(f"SELECT * FROM {table_name} WHERE id >= ? LIMIT 1", (rand_id,))
-                result = cursor.fetchone()
 
-                if not result:
-                    cursor.execute(f"SELECT * FROM {table_name} LIMIT 1")
-                    result = cursor.fetchone()
+def restore_deferred_indexes(db_path: str = config.MOL_DB_PATH) -> int:
+    """
+    批量装载删掉的索引连同 DDL 记在 _deferred_indexes 表里，正常结束时由装载方重建；
+    装载进程崩溃/被杀后留下的由这里补建。入库开始和服务启动时各调用一次，装载进程还活着的条目不动。
+    :return: 补建的索引数
+    """
+    if not os.path.exists(db_path):
+        return 0
 
-                if result:
-                    data = dict(result)
-            else:
-                logger.warning(f"Table {table_name} seems empty.")
+    with get_conn(db_path) as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (DEFERRED_INDEX_TABLE,)).fetchone() is None:
+            return 0
 
-    except Exception as e:
-        logger.error(f"Error getting random line from {table_name}: {e}")
+        rows = conn.execute(f"SELECT name, tbl_name, sql, pid FROM {DEFERRED_INDEX_TABLE}").fetchall()
+        stale = [row for row in rows if not _pid_alive(row[3])]
+        if not stale:
+            return 0
+
+        with conn:
+            _create_indexes(conn, [(name, sql) for name, _, sql, _ in stale])
+        for table_name in {row[1] for row in stale}:
+            conn.execute(f"ANALYZE {table_name}")
+        conn.commit()
 
-    return data
+    logger.warning(f"Restored {len(stale)} indexes left dropped by an interrupted bulk load: "
+                   f"{', '.join(row[0] for row in stale)}")
+    return len(stale)
+
+
+class BatchWriter:
+    """
+    入库的单一写者：一条常驻连接，每批 (可跨多张表) 一个事务，同表同列的行用 executemany
+    每张表内的写入顺序与调用顺序一致，自增 id 与逐行插入相同
+
+    bulk=True 为批量装载模式：
+    - 连接级 synchronous=OFF / temp_store=MEMORY / 大 cache，只影响本连接，关闭即恢复
+    - 每张表第一次写入前删掉它显式建的二级索引 (DDL 先记进 _deferred_indexes)，
+      退出时按原 SQL 重建并 ANALYZE 这些表；中途被杀则由 restore_deferred_indexes 补建
+    写失败的批次回滚后逐行重试，坏行计数并记下错误，不会整批静默丢失
+    """
+
+    MAX_ERROR_SAMPLES = 20
+
+    def __init__(self, db_path: str = config.MOL_DB_PATH, bulk: bool = False):
+        self.db_path = db_path
+        self.bulk = bulk
+        self._conn: Optional[sqlite3.Connection] = None
+        self._deferred_indexes: List[tuple] = []
+        self._deferred_tables: set = set()
+        self.rows = 0
+        self.batches = 0
+        self.failed_rows = 0
+        self.failed_batches = 0
+        self.error_samples: List[str] = []
+        self.write_time = 0.0
+        self.index_time = 0.0
+
+    def __enter__(self) -> "BatchWriter":
+        if self.bulk:
+            restore_deferred_indexes(self.db_path)  # 上一次装载没走完的先补上
+        self._conn = sqlite3.connect(self.db_path)
+        if self.bulk:
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn.execute(f"PRAGMA cache_size=-{int(config.INGEST_CACHE_SIZE_KB)}")
+            with self._conn:
+                _ensure_deferred_index_table(self._conn)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.bulk and self._conn is not None:
+                self._rebuild_indexes()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _defer_indexes(self, table_name: str):
+        """只动本次写入的表；sql 为 NULL 的是主键/UNIQUE 的自动索引，不能删也不用删"""
+        if table_name in self._deferred_tables:
+            return
+        self._deferred_tables.add(table_name)
+
+        indexes = self._conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table_name,)
+        ).fetchall()
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {DEFERRED_INDEX_TABLE} (name, tbl_name, sql, pid) VALUES (?, ?, ?, ?)",
+                [(name, table_name, sql, os.getpid()) for name, sql in indexes])
+            for name, _ in indexes:
+                self._conn.execute(f"DROP INDEX IF EXISTS {name}")
+        self._deferred_indexes.extend(indexes)
+        logger.debug(f"Bulk load: deferred {len(indexes)} indexes on {table_name}")
+
+    def _rebuild_indexes(self):
+        start = time.perf_counter()
+        with self._conn:
+            _create_indexes(self._conn, self._deferred_indexes)
+        for table_name in self._deferred_tables:
+            self._conn.execute(f"ANALYZE {table_name}")
+        self._conn.commit()
+        self.index_time = time.perf_counter() - start
+        logger.debug(f"Bulk load: rebuilt {len(self._deferred_indexes)} indexes in {self.index_time:.2f}s")
+        self._deferred_indexes = []
+        self._deferred_tables = set()
+
+    def _record_error(self, message: str):
+        logger.error(f"存入mol数据库发生异常: {message}")
+        if len(self.error_samples) < self.MAX_ERROR_SAMPLES:
+            self.error_samples.append(message)
+
+    def write(self, rows: List[tuple]):
+        """
+        :param rows: [(table_name, row_dict), ...]，按入库顺序
+        """
+        if not rows:
+            return
+
+        # 同表同列的行合并成一次 executemany，表内顺序不变 (各表的自增 id 互不相关)
+        groups: Dict[tuple, list] = {}
+        for table_name, row in rows:
+            groups.setdefault((table_name, tuple(row.keys())), []).append(tuple(row.values()))
+
+        start = time.perf_counter()
+        if self.bulk:
+            for table_name, _ in groups:
+                self._defer_indexes(table_name)
+        try:
+            with self._conn:
+                for (table_name, columns), values in groups.items():
+                    self._conn.executemany(self._insert_sql(table_name, columns), values)
+        except sqlite3.Error as e:
+            self.failed_batches += 1
+            self._record_error(f"batch of {len(rows)} rows rolled back: {e}")
+            self._write_rowwise(groups)
+        else:
+            self.rows += len(rows)
+        self.batches += 1
+        self.write_time += time.perf_counter() - start
+
+    def _write_rowwise(self, groups: Dict[tuple, list]):
+        """整批回滚后逐行重试：单条语句失败只撤销该语句，好行照常提交"""
+        with self._conn:
+            for (table_name, columns), values in groups.items():
+                sql = self._insert_sql(table_name, columns)
+                for value in values:
+                    try:
+                        self._conn.execute(sql, value)
+                        self.rows += 1
+                    except sqlite3.Error as e:
+                        self.failed_rows += 1
+                        self._record_error(f"{table_name}: {e}")
+
+    @staticmethod
+    def _insert_sql(table_name: str, columns: tuple) -> str:
+        placeholders = ", ".join(["?"] * len(columns))
+        return f"INSERT OR REPLACE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.rows,
+            "batches": self.batches,
+            "failed_rows": self.failed_rows,
+            "failed_batches": self.failed_batches,
+            "rows_per_s": round(self.rows / self.write_time, 1) if self.write_time else 0.0,
+            "write_s": round(self.write_time, 3),
+            "index_s": round(self.index_time, 3),
+        }
 
 
 def exec_sql(sql_cmd: str, db_path: str = config.MOL_DB_PATH):
@@ -121,8 +456,7 @@ def eval_sql(sql_cmd: str, db_path: str = config.MOL_DB_PATH) -> Optional[List[A
     用于查询 SELECT，返回数据
     """
     try:
-        with get_conn(db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with read_conn(db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(sql_cmd)
             return cursor.fetchall()
@@ -135,8 +469,7 @@ def eval_sql(sql_cmd: str, db_path: str = config.MOL_DB_PATH) -> Optional[List[A
 def get_mol_info_by_path(table_name: str, path: str) -> Optional[Dict[str, Any]]:
     """根据文件路径获取特定分子的信息"""
     try:
-        with get_conn(config.MOL_DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with read_conn() as conn:
             cursor = conn.cursor()
             cursor.execute(f"SELECT * FROM {table_name} WHERE path = ?", (path,))
             result = cursor.fetchone()
@@ -150,8 +483,7 @@ def get_mol_by_page(table_name: str, page: int = 1, limit: int = 20) -> List[Dic
     """分页获取分子列表 (只返回 id 和 path 以减少流量)"""
     offset = (page - 1) * limit
     try:
-        with get_conn(config.MOL_DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with read_conn() as conn:
             cursor = conn.cursor()
             cursor.execute(f"SELECT id, path FROM {table_name} LIMIT ? OFFSET ?", (limit, offset))
             return [dict(row) for row in cursor.fetchall()]
@@ -162,7 +494,7 @@ def get_mol_by_page(table_name: str, page: int = 1, limit: int = 20) -> List[Dic
 def get_table_count(table_name: str) -> int:
     """获取表中总记录数"""
     try:
-        with get_conn(config.MOL_DB_PATH) as conn:
+        with read_conn() as conn:
             cursor = conn.cursor()
             cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
             return cursor.fetchone()[0]
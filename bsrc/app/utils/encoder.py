@@ -0,0 +1,74 @@
+"""
+验证码图片的输出格式。
+加噪后的图片是带大量噪点的 RGBA，PIL 默认 PNG (compress_level=6) 既不是最小也不是最快，
+这里提供几种格式按部署/按请求选择，取舍见 scripts/bench_formats.py。
+svg 是矢量格式，由 MolDraw2DSVG 后端直接产出 (见 app.captcha.utils.finish_svg)，不经过这里的像素编码。
+"""
+import io
+from typing import Callable, Dict, NamedTuple, Union
+import numpy as np
+from PIL import Image
+import app.utils.config as config
+from app.utils.exceptions import CaptchaException
+
+
+class ImageFormat(NamedTuple):
+    media_type: str
+    encode: Callable[[Image.Image], bytes]
+
+
+def _save(image: Image.Image, fmt: str, **kwargs) -> bytes:
+    out_stream = io.BytesIO()
+    image.save(out_stream, format=fmt, **kwargs)
+    return out_stream.getvalue()
+
+
+def _png(image: Image.Image) -> bytes:
+    return _save(image, "PNG")
+
+
+def _png_fast(image: Image.Image) -> bytes:
+    return _save(image, "PNG", compress_level=config.PNG_FAST_COMPRESS_LEVEL)
+
+
+def _png_palette(image: Image.Image) -> bytes:
+    """量化到调色板 (RGBA 只能用 FASTOCTREE)，体积通常是真彩 PNG 的一半以下"""
+    quantized = image.quantize(colors=config.PNG_PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+    return _save(quantized, "PNG", compress_level=config.PNG_FAST_COMPRESS_LEVEL)
+
+
+def _webp(image: Image.Image) -> bytes:
+    return _save(image, "WEBP", quality=config.WEBP_QUALITY, method=config.WEBP_METHOD)
+
+
+def _webp_lossless(image: Image.Image) -> bytes:
+    # 无损模式下 quality 表示压缩力度
+    return _save(image, "WEBP", lossless=True, quality=config.WEBP_LOSSLESS_EFFORT, method=config.WEBP_METHOD)
+
+
+def _vector(image: Image.Image) -> bytes:
+    raise CaptchaException("svg is produced by the SVG render backend, not encoded from pixels")
+
+
+IMAGE_FORMATS: Dict[str, ImageFormat] = {
+    "png": ImageFormat("image/png", _png),
+    "png_fast": ImageFormat("image/png", _png_fast),
+    "png_palette": ImageFormat("image/png", _png_palette),
+    "webp": ImageFormat("image/webp", _webp),
+    "webp_lossless": ImageFormat("image/webp", _webp_lossless),
+    config.IMAGE_FORMAT_SVG: ImageFormat("image/svg+xml", _vector),
+}
+
+
+def get_format(fmt: str) -> ImageFormat:
+    image_format = IMAGE_FORMATS.get(fmt)
+    if image_format is None:
+        raise CaptchaException(f"Unknown image format: {fmt}")
+    return image_format
+
+
+def encode_image(image: Union[Image.Image, np.ndarray], fmt: str) -> bytes:
+    """RGBA 像素数组或 PIL 图片 -> 指定格式的字节"""
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image, "RGBA")
+    return get_format(fmt).encode(image)
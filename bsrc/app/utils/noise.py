@@ -1,15 +1,270 @@
-import random
+"""
+验证码干扰层：
+- 现算：在像素数组上批量撒点、批量光栅化线段
+- 预计算库：启动时为常用画布尺寸生成 (或从磁盘加载) 几千张稀疏干扰层，
+  每次请求随机取一张，加随机平移/翻转/颜色抖动后一次性写入 (与现算相同，直接覆盖)
+- SVG：同样数量和颜色分布的线段/点，直接输出为 SVG 图元
+"""
 import io
-from PIL import Image, ImageDraw
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+import app.utils.config as config
+from app.utils.encoder import encode_image
+from app.utils.logger import logger
+
+_rng = np.random.default_rng()
+
+
+def _line_pixels(x1: np.ndarray, y1: np.ndarray, x2: np.ndarray, y2: np.ndarray) -> tuple:
+    """
+    批量光栅化线段 (DDA)：所有线段一次性展开成像素坐标，不逐条调用 draw.line
+    :return: (xs, ys, seg) seg 为每个像素所属的线段下标
+    """
+    dx, dy = x2 - x1, y2 - y1
+    steps = np.maximum(np.abs(dx), np.abs(dy)) + 1
+    seg = np.repeat(np.arange(len(steps)), steps)
+    # 每个像素在自己线段内的序号 0..steps-1
+    offsets = np.arange(seg.size) - np.repeat(np.cumsum(steps) - steps, steps)
+    t = offsets / np.maximum(steps - 1, 1)[seg]
+    xs = np.rint(x1[seg] + dx[seg] * t).astype(np.int64)
+    ys = np.rint(y1[seg] + dy[seg] * t).astype(np.int64)
+    return xs, ys, seg
+
+
+def _noise_pixels(width: int, height: int, density: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    一层干扰的稀疏表示 (xs, ys, colors[N, 4])，先线后点，后写覆盖先写
+    数量、颜色、线宽：density*3 条线 (alpha 200，1~2px)，density*50 个点 (不透明)
+    """
+    line_count = density * 3
+    x1, x2 = _rng.integers(0, width + 1, (2, line_count))
+    y1, y2 = _rng.integers(0, height + 1, (2, line_count))
+    line_colors = np.empty((line_count, 4), dtype=np.uint8)
+    line_colors[:, :3] = _rng.integers(0, 101, (line_count, 3))
+    line_colors[:, 3] = 200
+    line_widths = _rng.integers(1, 3, line_count)
+
+    xs, ys, seg = _line_pixels(x1, y1, x2, y2)
+    # 2px 宽的线沿次方向多铺一排
+    thick = line_widths[seg] == 2
+    steep = (np.abs(y2 - y1) > np.abs(x2 - x1))[seg] & thick
+    flat = ~steep & thick
+    xs = np.concatenate([xs, xs[steep] + 1, xs[flat]])
+    ys = np.concatenate([ys, ys[steep], ys[flat] + 1])
+    colors = line_colors[np.concatenate([seg, seg[steep], seg[flat]])]
+
+    point_count = density * 50
+    px = _rng.integers(0, width + 1, point_count)
+    py = _rng.integers(0, height + 1, point_count)
+    point_colors = np.empty((point_count, 4), dtype=np.uint8)
+    point_colors[:, :3] = _rng.integers(0, 151, (point_count, 3))
+    point_colors[:, 3] = 255
+
+    xs = np.concatenate([xs, px])
+    ys = np.concatenate([ys, py])
+    colors = np.concatenate([colors, point_colors])
+
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    return xs[inside], ys[inside], colors[inside]
+
+
+def _noise_svg(width: int, height: int, density: int) -> List[str]:
+    """与 _noise_pixels 同分布的干扰，输出为 SVG 元素 (线段 <line>，点 1x1 <rect>)"""
+    line_count = density * 3
+    x1, x2 = _rng.integers(0, width + 1, (2, line_count))
+    y1, y2 = _rng.integers(0, height + 1, (2, line_count))
+    line_colors = _rng.integers(0, 101, (line_count, 3))
+    line_widths = _rng.integers(1, 3, line_count)
+
+    point_count = density * 50
+    px = _rng.integers(0, width + 1, point_count)
+    py = _rng.integers(0, height + 1, point_count)
+    point_colors = _rng.integers(0, 151, (point_count, 3))
+
+    elements = [
+        f"<line x1='{x1[i]}' y1='{y1[i]}' x2='{x2[i]}' y2='{y2[i]}' stroke='#{r:02x}{g:02x}{b:02x}' "
+        f"stroke-opacity='0.78' stroke-width='{line_widths[i]}'/>"
+        for i, (r, g, b) in enumerate(line_colors.tolist())
+    ]
+    elements.extend(
+        f"<rect x='{px[i]}' y='{py[i]}' width='1' height='1' fill='#{r:02x}{g:02x}{b:02x}'/>"
+        for i, (r, g, b) in enumerate(point_colors.tolist())
+    )
+    return elements
+
+
+def _paint(pixels: np.ndarray, flat: np.ndarray, colors: np.ndarray):
+    """
+    把干扰像素按 flat 下标写进 RGBA 画布 (H, W, 4)，直接覆盖不做 alpha 合成，同一像素后写覆盖先写
+    与原先 ImageDraw 在 RGBA 图上画线/点的效果一致；库和现算两条路径都走这里
+    RGBA 按 uint32 整像素写入
+    """
+    pixels.view(np.uint32).reshape(-1)[flat] = colors.view(np.uint32).reshape(-1)
+
+
+class NoiseLibrary:
+    """
+    某一画布尺寸的干扰层库。
+    每层只存被覆盖的像素 (flat 下标 int32 + RGBA)，所有层拼在一起按 offsets 切分，
+    800x600、density=3 一层约 3k 像素 / 24KB，几千层也只有几十 MB。
+    """
+    BYTES_PER_PIXEL = 8  # int32 下标 + 4 字节颜色
+
+    def __init__(self, width: int, height: int, density: int,
+                 indices: np.ndarray, colors: np.ndarray, offsets: np.ndarray, spec: tuple = ()):
+        self.width = width
+        self.height = height
+        self.density = density
+        self.indices = indices
+        self.colors = colors
+        self.offsets = offsets
+        self.spec = spec  # 生成参数 (层数, 内存上限)，配置变了才重建
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.colors.nbytes + self.offsets.nbytes
+
+    @classmethod
+    def build(cls, width: int, height: int, density: int, size: int, max_bytes: int) -> "NoiseLibrary":
+        """生成 size 层，累计内存超过 max_bytes 时提前停止"""
+        indices, colors, offsets = [], [], [0]
+        used = 0
+        for _ in range(size):
+            xs, ys, c = _noise_pixels(width, height, density)
+            used += xs.size * cls.BYTES_PER_PIXEL
+            if used > max_bytes and len(offsets) > 1:
+                break
+            indices.append((ys * width + xs).astype(np.int32))
+            colors.append(c)
+            offsets.append(offsets[-1] + xs.size)
+
+        return cls(width, height, density,
+                   np.concatenate(indices), np.concatenate(colors), np.asarray(offsets, dtype=np.int64),
+                   spec=(size, max_bytes))
+
+    @classmethod
+    def load(cls, path: str) -> "NoiseLibrary":
+        with np.load(path) as data:
+            width, height, density = (int(v) for v in data["shape"])
+            spec = tuple(int(v) for v in data["spec"])
+            return cls(width, height, density, data["indices"], data["colors"], data["offsets"], spec=spec)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, shape=np.asarray([self.width, self.height, self.density]), spec=np.asarray(self.spec),
+                 indices=self.indices, colors=self.colors, offsets=self.offsets)
+        os.replace(tmp_path, path)
+
+    def apply(self, pixels: np.ndarray, jitter: int = 20):
+        """
+        随机取一层，随机平移 (环绕) + 水平/垂直翻转 + 颜色抖动后写到 pixels 上
+        """
+        i = int(_rng.integers(len(self)))
+        start, end = self.offsets[i], self.offsets[i + 1]
+        ys, xs = np.divmod(self.indices[start:end], self.width)
+        colors = self.colors[start:end]
+
+        if _rng.random() < 0.5:
+            xs = self.width - 1 - xs
+        if _rng.random() < 0.5:
+            ys = self.height - 1 - ys
+        xs = (xs + int(_rng.integers(self.width))) % self.width
+        ys = (ys + int(_rng.integers(self.height))) % self.height
+
+        if jitter:
+            shift = _rng.integers(-jitter, jitter + 1, 3)
+            colors = colors.copy()
+            colors[:, :3] = np.clip(colors[:, :3].astype(np.int16) + shift, 0, 255)
+
+        _paint(pixels, ys * self.width + xs, colors)
+
+
+_libraries: Dict[Tuple[int, int, int], NoiseLibrary] = {}
+_libraries_lock = threading.Lock()
+
+
+def _library_path(width: int, height: int, density: int) -> str:
+    return os.path.join(config.NOISE_LIBRARY_DIR, f"noise_{width}x{height}_d{density}.npz")
+
+
+def load_noise_libraries(sizes: Iterable[Tuple[int, int]], density: int = 3):
+    """
+    启动时为常用尺寸准备干扰层库：磁盘上有就加载，没有就生成并落盘。
+    其它尺寸不建库 (避免任意尺寸撑爆内存)，请求时回退到现算。
+    """
+    if not config.NOISE_LIBRARY_ENABLED:
+        return
+
+    max_bytes = config.NOISE_LIBRARY_MAX_MB * 1024 * 1024
+    for width, height in sizes:
+        key = (width, height, density)
+        if key in _libraries:
+            continue
+
+        path = _library_path(width, height, density)
+        start = time.perf_counter()
+        library = None
+        if os.path.exists(path):
+            try:
+                library = NoiseLibrary.load(path)
+            except Exception as e:
+                logger.warning(f"Broken noise library {path}: {e}")
+
+        if library is None or library.spec != (config.NOISE_LIBRARY_SIZE, max_bytes):
+            library = NoiseLibrary.build(width, height, density, config.NOISE_LIBRARY_SIZE, max_bytes)
+            try:
+                library.save(path)
+            except OSError as e:
+                logger.warning(f"Failed to save noise library {path}: {e}")
+
+        with _libraries_lock:
+            _libraries[key] = library
+        logger.info(f"Noise library {width}x{height}: {len(library)} layers, "
+                    f"{library.nbytes / 1024 / 1024:.1f} MB, {time.perf_counter() - start:.2f}s")
+
+
+def get_noise_library(width: int, height: int, density: int = 3) -> Optional[NoiseLibrary]:
+    return _libraries.get((width, height, density))
 
 
 class NoiseUtils:
     @staticmethod
-    def add_interference(img_bytes: bytes, density: int = 2) -> bytes:
+    def add_interference_array(pixels: np.ndarray, density: int = 2) -> np.ndarray:
+        """
+        在 RGBA 像素数组 (H, W, 4) 上原地添加干扰线和噪点
+        有预计算库的尺寸直接写入库里的一层，否则现算
+        """
+        height, width = pixels.shape[:2]
+        library = get_noise_library(width, height, density)
+        if library is not None:
+            library.apply(pixels)
+            return pixels
+
+        xs, ys, colors = _noise_pixels(width, height, density)
+        _paint(pixels, ys * width + xs, colors)
+        return pixels
+
+    @staticmethod
+    def svg_interference(width: int, height: int, density: int = 2) -> List[str]:
+        """SVG 出图用：干扰线和噪点的 SVG 元素列表，由调用方插入到图中"""
+        return _noise_svg(width, height, density)
+
+    @staticmethod
+    def add_interference(img_bytes: bytes, density: int = 2, fmt: str = "png") -> bytes:
         """
         给图片添加干扰线和噪点
+        Cairo 绘图只能拿到 PNG，所以解码一次，之后全部在像素数组上完成，最后只编码一次
         :param img_bytes: 原图字节流
         :param density: 干扰密度等级 (1-5)
+        :param fmt: 输出格式，见 app.utils.encoder.IMAGE_FORMATS
         :return: 加噪后的字节流
         """
         image = Image.open(io.BytesIO(img_bytes))
@@ -17,29 +272,7 @@ class NoiseUtils:
         if image.mode != 'RGBA':
             image = image.convert('RGBA')
 
-        draw = ImageDraw.Draw(image)
-        width, height = image.size
-
-        line_count = density * 3
-        for _ in range(line_count):
-            x1 = random.randint(0, width)
-            y1 = random.randint(0, height)
-            x2 = random.randint(0, width)
-            y2 = random.randint(0, height)
-
-            fill_color = (random.randint(0, 100), random.randint(0, 100), random.randint(0, 100), 200)
-            width_px = random.randint(1, 2)
-            draw.line([(x1, y1), (x2, y2)], fill=fill_color, width=width_px)
-
-        point_count = density * 50
-        for _ in range(point_count):
-            x = random.randint(0, width)
-            y = random.randint(0, height)
-
-            fill_color = (random.randint(0, 150), random.randint(0, 150), random.randint(0, 150), 255)
-            draw.point((x, y), fill=fill_color)
-
+        pixels = np.array(image)
+        NoiseUtils.add_interference_array(pixels, density=density)
 
-        out_stream = io.BytesIO()
-        image.save(out_stream, format='PNG')
-        return out_stream.getvalue()
\ No newline at end of file
+        return encode_image(pixels, fmt)
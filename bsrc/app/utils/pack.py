@@ -0,0 +1,160 @@
+"""
+单文件打包存储 (key -> 二进制块)：
+    xxx.pack      数据区：MAGIC + 依次追加的二进制块
+    xxx.pack.idx  索引：每行 "key\\toffset\\tlength"
+
+写入端只追加，先写数据再写索引，读端只认索引里出现过的、且完整落盘的块，
+因此入库脚本边写、服务端边读是安全的。
+读端用 mmap 映射整个数据区，取块没有 open/stat 等逐条系统调用。
+"""
+import mmap
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+from app.utils.exceptions import DataBaseException
+from app.utils.logger import logger
+
+MAGIC = b"CCPK\x01"
+
+
+class PackWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._data = open(path, "ab")
+        if self._data.tell() == 0:
+            self._data.write(MAGIC)
+        self._index = open(self.index_path, "a", encoding="utf-8")
+        self._offset = self._data.tell()
+        self.count = 0
+
+    def add(self, key: str, blob: bytes) -> Tuple[int, int]:
+        if "\t" in key or "\n" in key:
+            raise DataBaseException(f"Invalid pack key: {key!r}")
+
+        offset = self._offset
+        self._data.write(blob)
+        self._offset += len(blob)
+        self._index.write(f"{key}\t{offset}\t{len(blob)}\n")
+        self.count += 1
+        return offset, len(blob)
+
+    def flush(self):
+        """先落数据区再落索引，读端看到索引时数据一定完整"""
+        self._data.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PackReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._index_pos = 0
+        self._last_reload = 0.0
+
+        self._reload()
+
+    def _remap(self):
+        size = os.path.getsize(self.path)
+        if size == self._mapped_size or size <= len(MAGIC):
+            return
+
+        if self._file is None:
+            self._file = open(self.path, "rb")
+            if self._file.read(len(MAGIC)) != MAGIC:
+                raise DataBaseException(f"Not a pack file: {self.path}")
+
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped_size = size
+
+    def _reload(self):
+        """增量读取新增的索引行；写入端还在追加时只接收完整的行"""
+        self._last_reload = time.time()
+        if not os.path.exists(self.path) or not os.path.exists(self.index_path):
+            return
+
+        added = 0
+        with self._lock:
+            self._remap()
+
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                f.seek(self._index_pos)
+                while True:
+                    line = f.readline()
+                    if not line.endswith("\n"):
+                        break
+                    key, offset, length = line.rstrip("\n").split("\t")
+                    offset, length = int(offset), int(length)
+                    if offset + length > self._mapped_size:
+                        break
+                    self._index[key] = (offset, length)
+                    self._index_pos = f.tell()
+                    added += 1
+
+        if added:
+            logger.debug(f"Pack {os.path.basename(self.path)}: +{added} entries")
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """返回映射区上的 memoryview (不拷贝)，不存在返回 None"""
+        loc = self._index.get(key)
+        if loc is None:
+            return None
+        offset, length = loc
+        return memoryview(self._mm)[offset:offset + length]
+
+    def refresh(self, max_age: float = 0.0):
+        """重读新增的索引行；max_age > 0 时距上次重读不足 max_age 秒直接返回"""
+        if max_age > 0 and time.time() - self._last_reload < max_age:
+            return
+        self._reload()
+
+    def keys(self) -> Iterator[str]:
+        return iter(list(self._index.keys()))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._index), "bytes": self._mapped_size}
+
+
+_readers: Dict[str, PackReader] = {}
+_readers_lock = threading.Lock()
+
+
+def get_pack_reader(path: str) -> Optional[PackReader]:
+    """打包文件不存在时返回 None，调用方自行回退"""
+    reader = _readers.get(path)
+    if reader is None:
+        if not os.path.exists(path):
+            return None
+        with _readers_lock:
+            reader = _readers.get(path)
+            if reader is None:
+                reader = PackReader(path)
+                _readers[path] = reader
+    return reader
@@ -0,0 +1,70 @@
+"""
+验证码图片的内存暂存区：
+binary 交付模式下，generate 只返回元数据和短 id，图片字节由 GET /api/captcha/image/{id} 原样返回，
+不做 base64、不进 pydantic 序列化，也不重新编码。
+
+注意：暂存区在进程内，多个 uvicorn worker 时需要会话粘滞 (或单 worker + 渲染进程池)。
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class ImageStore:
+    def __init__(self, ttl: float, max_bytes: int):
+        """
+        :param ttl: 图片保留时间 (秒)，与 token 有效期一致即可
+        :param max_bytes: 总字节上限，超出时淘汰最早的图片
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, Tuple[bytes, str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop_oldest(self):
+        _, (data, _, _) = self._items.popitem(last=False)
+        self._bytes -= len(data)
+
+    def _expire(self, now: float):
+        while self._items:
+            _, (_, _, expires_at) = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            self._drop_oldest()
+
+    def put(self, data: bytes, media_type: str) -> str:
+        image_id = secrets.token_urlsafe(12)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            while self._items and self._bytes + len(data) > self.max_bytes:
+                self._drop_oldest()
+                self.evictions += 1
+            self._items[image_id] = (data, media_type, now + self.ttl)
+            self._bytes += len(data)
+        return image_id
+
+    def get(self, image_id: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            item = self._items.get(image_id)
+            if item is None or item[2] <= time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[0], item[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
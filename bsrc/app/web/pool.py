@@ -0,0 +1,165 @@
+"""
+预渲染验证码池：
+后台线程为每个 (插件, 常用尺寸) 维护一个有界队列，接口直接弹出现成的验证码，
+队列为空时才回退到同步生成。
+"""
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from app.web.security import create_captcha_token
+from app.utils.logger import logger
+
+
+PoolKey = Tuple[str, int, int]
+
+
+class PooledCaptcha:
+    """
+    池中的一条验证码：渲染结果 (图片字节、提示语) + 签发 token 所需参数。
+    token 带有时间戳 (有效期 EXPIRED_TIME)，所以在出池时才签发，排队时间不会吃掉有效期；
+    响应体也在出池时按交付方式 (base64 / binary) 组装。
+    """
+    __slots__ = ("img_data", "desc", "token_args", "created_at")
+
+    def __init__(self, img_data: dict, desc: str, token_args: dict):
+        self.img_data = img_data
+        self.desc = desc
+        self.token_args = token_args
+        self.created_at = time.time()
+
+    def mint_token(self) -> str:
+        return create_captcha_token(**self.token_args)
+
+
+class CaptchaPool:
+    def __init__(self,
+                 producer: Callable[[str, int, int], PooledCaptcha],
+                 slugs: Iterable[str],
+                 sizes: Iterable[Tuple[int, int]],
+                 capacity: int = 16,
+                 idle_sleep: float = 0.2,
+                 error_sleep: float = 1.0):
+        """
+        :param producer: 生成一条 PooledCaptcha 的函数 (slug, width, height)
+        :param slugs: 需要预渲染的插件
+        :param sizes: 需要预渲染的尺寸
+        :param capacity: 每个队列的上限
+        """
+        self.producer = producer
+        self.capacity = capacity
+        self.idle_sleep = idle_sleep
+        self.error_sleep = error_sleep
+
+        self._queues: Dict[PoolKey, queue.Queue] = {
+            (slug, w, h): queue.Queue(maxsize=capacity)
+            for slug in slugs for (w, h) in sizes
+        }
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.produced = 0
+        self.failures = 0
+        self._produce_times = deque(maxlen=256)  # 最近的入池时间点，用于计算补货速率
+
+    def supports(self, slug: str, width: int, height: int) -> bool:
+        return (slug, width, height) in self._queues
+
+    def pop(self, slug: str, width: int, height: int) -> Optional[PooledCaptcha]:
+        """取出一条现成的验证码，没有则返回 None (调用方自行同步生成)"""
+        q = self._queues.get((slug, width, height))
+        if q is None:
+            return None
+
+        try:
+            item = q.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return item
+
+    def _most_starved(self) -> Optional[PoolKey]:
+        """填充率最低的队列优先补货，全部满了返回 None"""
+        best_key, best_depth = None, self.capacity
+        for key, q in self._queues.items():
+            depth = q.qsize()
+            if depth < best_depth:
+                best_key, best_depth = key, depth
+        return best_key
+
+    def _run(self):
+        logger.info(f"Captcha pool producer started: {len(self._queues)} queues x {self.capacity}")
+        while not self._stop.is_set():
+            key = self._most_starved()
+            if key is None:
+                self._stop.wait(self.idle_sleep)
+                continue
+
+            try:
+                item = self.producer(*key)
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                logger.error(f"Captcha pool failed to produce {key}: {e}")
+                self._stop.wait(self.error_sleep)
+                continue
+
+            try:
+                self._queues[key].put_nowait(item)
+            except queue.Full:
+                continue
+
+            with self._lock:
+                self.produced += 1
+                self._produce_times.append(time.time())
+
+        logger.info("Captcha pool producer stopped")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="captcha-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def refill_rate(self, window: float = 60.0) -> float:
+        """最近 window 秒内平均每秒入池数量"""
+        now = time.time()
+        with self._lock:
+            recent: List[float] = [t for t in self._produce_times if now - t <= window]
+        if not recent:
+            return 0.0
+        span = max(now - recent[0], 1e-6)
+        return len(recent) / span
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            produced, failures = self.produced, self.failures
+
+        total = hits + misses
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "capacity": self.capacity,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "produced": produced,
+            "failures": failures,
+            "refill_rate": round(self.refill_rate(), 3),
+            "depth": {f"{slug}@{w}x{h}": q.qsize() for (slug, w, h), q in self._queues.items()},
+        }
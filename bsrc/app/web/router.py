@@ -1,13 +1,20 @@
+import asyncio
 import random
+import base64
 import json
 import time
-from typing import Any
-from fastapi import APIRouter, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from fastapi import APIRouter, HTTPException, Response, Header
 from app.captcha.plugins import PLUGINS
 from app.utils import config
 from app.web.schemas import CaptchaGenerateResponse
 from app.web.security import create_captcha_token, parse_captcha_token
-from app.captcha.utils import aes_cbc_encrypt, aes_cbc_decrypt
+from app.web.pool import CaptchaPool, PooledCaptcha
+from app.web.workers import RenderWorkers, LoopLagMonitor
+from app.web.images import ImageStore
+from app.utils.encoder import IMAGE_FORMATS
+from app.captcha.utils import aes_cbc_encrypt, aes_cbc_decrypt, clamp_size
 from app.utils.config import FRONT_AES_KEY
 from app.utils.config import DEFAULT_WIDTH, DEFAULT_HEIGHT
 from app.utils.logger import logger
@@ -22,8 +29,10 @@ class EncryptedPayload(BaseModel):
     data: str
 
 
-def captcha_util(s: str, plugin_class: Any, width: int, height: int, path = "") -> Any:
+def render_captcha(s: str, plugin_class: Any, width: int, height: int, path = "", fmt: str = config.IMAGE_FORMAT) -> Any:
+    """完成渲染，token 所需参数单独返回，由调用方决定何时签发"""
     captcha = plugin_class(width=width, height=height, runtime=True, mol_path=path)
+    captcha.image_format = fmt
     img_data = captcha.generate_img()
     # answer = captcha.generate_answer()  #  gemini不知道为什么想的要这样写？？
 
@@ -32,34 +41,111 @@ def captcha_util(s: str, plugin_class: Any, width: int, height: int, path = "")
 
     smart = getattr(captcha, 'target_smarts', "")
 
+    token_args = {
+        "slug": s, "path": path, "width": width, "height": height, "smart": smart,
+        "answer": captcha.pack_answer(),
+    }
 
-    token = create_captcha_token(s, path, width, height, smart)
+    return img_data, desc, token_args
+
+
+def _render_task(s: str, width: int, height: int, path = "", fmt: str = config.IMAGE_FORMAT) -> Any:
+    """在渲染子进程中执行；插件按 slug 在子进程里查找，不跨进程传类"""
+    return render_captcha(s, PLUGINS[s], width, height, path, fmt)
+
+
+render_workers = RenderWorkers(config.WORKER_PROCESSES)
+loop_monitor = LoopLagMonitor(config.LOOP_LAG_INTERVAL)
+image_store = ImageStore(ttl=config.EXPIRED_TIME, max_bytes=config.IMAGE_STORE_MAX_MB * 1024 * 1024)
+# 验证只是 token 上的算术 (旧 token 才回退重建插件)，走自己的线程池，不排在渲染后面
+verify_executor = ThreadPoolExecutor(max_workers=config.VERIFY_THREADS, thread_name_prefix="verify")
+
+DELIVERY_MODES = ("base64", "binary")
+
+
+def _check_delivery(delivery: str):
+    if delivery not in DELIVERY_MODES:
+        raise HTTPException(status_code=400, detail=f"delivery must be one of {DELIVERY_MODES}")
+
+
+def resolve_format(fmt: Optional[str], accept: Optional[str]) -> str:
+    """?format= 优先；否则 Accept 明确声明 image/webp 时用 webp；都没有则用部署默认"""
+    if fmt:
+        if fmt not in IMAGE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {tuple(IMAGE_FORMATS)}")
+        return fmt
+    if accept and "image/webp" in accept:
+        return config.IMAGE_FORMAT_WEBP
+    return config.IMAGE_FORMAT
+
+
+def build_response(s: str, img_data: dict, desc: str, token: str, delivery: str) -> CaptchaGenerateResponse:
+    """
+    base64：图片内嵌在 JSON 里 (兼容旧前端)
+    binary：图片字节原样放进暂存区，只返回 image_id / image_url
+    """
+    fields = {}
+    if delivery == "binary":
+        image_id = image_store.put(img_data["img_bytes"], img_data["media_type"])
+        fields["image_id"] = image_id
+        fields["image_url"] = f"/api/captcha/image/{image_id}"
+    else:
+        fields["img_base64"] = base64.b64encode(img_data["img_bytes"]).decode('utf-8')
+
+    return CaptchaGenerateResponse(
+        slug=s,
+        media_type=img_data["media_type"],
+        width=img_data["size"]["width"],
+        height=img_data["size"]["height"],
+        prompt=desc,
+        token=token,
+        **fields
+    )
+
+
+async def captcha_util(s: str, width: int, height: int, path = "", fmt: str = config.IMAGE_FORMAT) -> Any:
+    img_data, desc, token_args = await render_workers.run(_render_task, s, width, height, path, fmt)
+    token = create_captcha_token(**token_args)
 
     return img_data, token, desc
 
 
+def _produce_pooled(slug_name: str, width: int, height: int) -> PooledCaptcha:
+    """预渲染池的生产函数 (后台线程调用，渲染同样交给子进程)"""
+    img_data, desc, token_args = render_workers.submit(_render_task, slug_name, width, height).result()
+    return PooledCaptcha(img_data, desc, token_args)
+
+
+captcha_pool = CaptchaPool(
+    producer=_produce_pooled,
+    slugs=PLUGINS.keys(),
+    sizes=config.POOL_SIZES,
+    capacity=config.POOL_CAPACITY,
+)
 
-def _generate_logic(slug_name: str, width: int, height: int) -> CaptchaGenerateResponse:
+
+async def _generate_logic(slug_name: str, width: int, height: int,
+                          delivery: str = config.IMAGE_DELIVERY,
+                          fmt: str = config.IMAGE_FORMAT) -> CaptchaGenerateResponse:
     if slug_name not in PLUGINS:
         raise HTTPException(status_code=404, detail="Plugin not found")
+    _check_delivery(delivery)
+    width, height = clamp_size(width, height)
+
+    # 预渲染池只存部署默认格式
+    pooled = captcha_pool.pop(slug_name, width, height) if fmt == config.IMAGE_FORMAT else None
+    if pooled is not None:
+        return build_response(slug_name, pooled.img_data, pooled.desc, pooled.mint_token(), delivery)
 
-    plugin_class = PLUGINS[slug_name]
     try:
-        img_data, token, desc = captcha_util(
+        img_data, token, desc = await captcha_util(
             s = slug_name,
-            plugin_class = plugin_class,
             width = width,
             height = height,
+            fmt = fmt,
         )
 
-        return CaptchaGenerateResponse(
-            slug=slug_name,
-            img_base64=img_data["img_base64"],
-            width=img_data["size"]["width"],
-            height=img_data["size"]["height"],
-            prompt=desc,
-            token=token
-        )
+        return build_response(slug_name, img_data, desc, token, delivery)
     except Exception as e:
         logger.error(f"Error generating captcha for {slug_name}: {e}")
         traceback.print_exc()
@@ -89,22 +175,28 @@ def _verify_logic(encrypted_data: str) -> dict:
             return {"success": False, "message": "Token expired"}
 
         slug_name = token_data.get("s")
-        # answer_data = token_data.get("a")
 
         if slug_name not in PLUGINS:
             return {"success": False, "message": "Unknown captcha type"}
 
-
         plugin_class = PLUGINS[slug_name]
-        captcha = plugin_class(token_data.get("w"), token_data.get("h"), mol_path=token_data.get("p"))
+        packed_answer = token_data.get("a")
+
+        if packed_answer:
+            # 答案几何已在 token 里：纯计算，不读文件、不碰 RDKit/Cairo
+            answer_data = plugin_class.unpack_answer(packed_answer)
+            is_valid = plugin_class.verify_packed(packed_answer, user_input)
+        else:
+            # 旧 token (无答案几何) 回退到重建插件
+            captcha = plugin_class(token_data.get("w"), token_data.get("h"), mol_path=token_data.get("p"))
 
-        if token_data.get("sm"):  # 可选项不为空
-            captcha.target_smarts = token_data.get("sm")
-            # print(captcha.target_smarts)  # debug !!!
+            if token_data.get("sm"):  # 可选项不为空
+                captcha.target_smarts = token_data.get("sm")
+                # print(captcha.target_smarts)  # debug !!!
 
-        answer_data = captcha.generate_answer()
+            answer_data = captcha.output_answer()
 
-        is_valid = captcha.verify(answer_data, user_input)
+            is_valid = captcha.verify(answer_data, user_input)
 
         logger.info(f"answer: {answer_data}")
         logger.info(f"user_input: {user_input}")
@@ -131,8 +223,10 @@ if config.DEV_MOD:
 
         def create_routes(s):
             @router.get(f"/captcha/{s}/generate", response_model=CaptchaGenerateResponse)
-            async def generate(width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT):
-                return _generate_logic(s, width, height)
+            async def generate(width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                               delivery: str = config.IMAGE_DELIVERY, format: Optional[str] = None,
+                               accept: Optional[str] = Header(None)):
+                return await _generate_logic(s, width, height, delivery, resolve_format(format, accept))
 
             @router.get(f"/captcha/{s}/catalog")
             async def get_catalog(page: int = 1, limit: int = 20):
@@ -153,25 +247,22 @@ if config.DEV_MOD:
                 }
 
             @router.get(f"/captcha/{s}/generate_custom", response_model=CaptchaGenerateResponse)
-            async def generate_custom(path: str, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT):
-                plugin_class = PLUGINS[s]
+            async def generate_custom(path: str, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                                      delivery: str = config.IMAGE_DELIVERY, format: Optional[str] = None,
+                                      accept: Optional[str] = Header(None)):
+                _check_delivery(delivery)
+                fmt = resolve_format(format, accept)
+                width, height = clamp_size(width, height)
                 try:
-                    img_data, token, desc = captcha_util(
+                    img_data, token, desc = await captcha_util(
                         s = s,
-                        plugin_class = plugin_class,
                         width = width,
                         height = height,
                         path = path,
+                        fmt = fmt,
                     )
 
-                    return CaptchaGenerateResponse(
-                        slug=s,
-                        img_base64=img_data["img_base64"],
-                        width=img_data["size"]["width"],
-                        height=img_data["size"]["height"],
-                        prompt=desc,
-                        token=token
-                    )
+                    return build_response(s, img_data, desc, token, delivery)
                 except Exception as e:
                     logger.error(f"Error generating custom captcha for {s}: {e}")
                     raise HTTPException(status_code=500, detail=str(e))
@@ -186,11 +277,40 @@ if config.DEV_MOD:
 
 
 @router.get("/captcha/random", response_model=CaptchaGenerateResponse)
-async def get_random_captcha(width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT):
+async def get_random_captcha(width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                             delivery: str = config.IMAGE_DELIVERY, format: Optional[str] = None,
+                             accept: Optional[str] = Header(None)):
     if not PLUGINS:
         raise HTTPException(status_code=500, detail="No plugins registered")
     slug_name = random.choice(list(PLUGINS.keys()))
-    return _generate_logic(slug_name, width, height)
+    return await _generate_logic(slug_name, width, height, delivery, resolve_format(format, accept))
+
+
+@router.get("/captcha/image/{image_id}")
+async def get_captcha_image(image_id: str):
+    """binary 交付模式的图片：暂存区里的字节原样返回，不做任何编码"""
+    item = image_store.get(image_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Image not found or expired")
+    data, media_type = item
+    return Response(content=data, media_type=media_type, headers={"Cache-Control": "private, no-store"})
+
+
+if config.STATS_ENDPOINT:
+    @router.get("/captcha/stats")
+    async def captcha_stats():
+        """
+        运行指标，用于容量规划
+        pool / workers / loop_lag / images 是父进程的；db / catalog / mol_cache / smarts 是父进程与各渲染子进程汇总的
+        """
+        await render_workers.refresh_stats()
+        return {
+            "pool": captcha_pool.stats(),
+            "workers": render_workers.stats(),
+            "loop_lag": loop_monitor.stats(),
+            "images": image_store.stats(),
+            **render_workers.process_stats(),
+        }
 
 
 @router.post("/captcha/verify")
@@ -199,8 +319,7 @@ async def verify_encrypted(payload: EncryptedPayload):
     接收 {"data": "BASE64..."}
     返回 {"data": "BASE64..."}
     """
-    # 执行验证
-    result_dict = _verify_logic(payload.data)
+    result_dict = await asyncio.get_running_loop().run_in_executor(verify_executor, _verify_logic, payload.data)
 
     # 加密响应
     result_json = json.dumps(result_dict)
@@ -1,10 +1,13 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class CaptchaGenerateResponse(BaseModel):
     """验证码生成响应"""
     slug: str                 # 插件类型 (方便前端debug，或者生产环境知道是啥)
-    img_base64: str           # 图片数据
+    img_base64: Optional[str] = None   # 图片数据 (base64 交付模式)
+    image_id: Optional[str] = None     # 图片 id (binary 交付模式，图片走 image_url)
+    image_url: Optional[str] = None
+    media_type: str = "image/png"      # 图片格式 (base64 模式拼 data URI 用)
     width: int
     height: int
     prompt: str               # 人类可读提示 (如：请点击所有的芳香环)
@@ -1,13 +1,17 @@
 import json
 import time
 import uuid
-from app.captcha.utils import aes_cbc_encrypt, aes_cbc_decrypt
-from app.utils.config import TOKEN_AES_KEY
+from typing import Optional
+from app.captcha.utils import aes_gcm_encrypt, aes_gcm_decrypt
+from app.utils.config import TOKEN_AES_KEY, TOKEN_PAD_BLOCK
 from app.utils.logger import logger
 
-def create_captcha_token(slug: str, path: str, width: int, height: int, smart: str) -> str:
+def create_captcha_token(slug: str, path: str, width: int, height: int, smart: str,
+                         answer: Optional[dict] = None) -> str:
     """
     将插件类型和答案数据打包加密成 Token
+    AES-GCM：token 由客户端保管，里面有答案几何，必须防篡改；明文按 TOKEN_PAD_BLOCK 补齐，长度不泄露答案大小
+    answer: 插件 pack_answer() 压缩后的答案几何，verify 时无需重建插件
     """
     payload = {
         "s": slug,
@@ -18,15 +22,17 @@ def create_captcha_token(slug: str, path: str, width: int, height: int, smart: s
         "h": height,
         "sm": smart,   ## 验证码可选项！！
     }
+    if answer is not None:
+        payload["a"] = answer
     json_str = json.dumps(payload)
-    return aes_cbc_encrypt(json_str, TOKEN_AES_KEY)
+    return aes_gcm_encrypt(json_str, TOKEN_AES_KEY, TOKEN_PAD_BLOCK)
 
 def parse_captcha_token(token: str) -> dict:
     """
     解密 Token 获取插件类型和答案
     """
     try:
-        json_str = aes_cbc_decrypt(token, TOKEN_AES_KEY)
+        json_str = aes_gcm_decrypt(token, TOKEN_AES_KEY)
         return json.loads(json_str)
     except Exception as e:
         logger.error(f"Token decryption failed: {e}")
@@ -0,0 +1,285 @@
+"""
+渲染进程池：
+RDKit 解析、Cairo 绘图、PIL 加噪都是 CPU 密集且持有 GIL，直接在 async 路由里跑会卡住事件循环，
+一个 uvicorn worker 同一时间只能出一张图。这里把生成丢到常驻的进程池 (验证只是 token 上的算术，不进池)，
+每个子进程启动时预加载 RDKit、字体、插件注册表和分子目录，之后的请求都是热的。
+
+另附两项指标：任务排队等待时间、事件循环延迟，用于确认高并发下事件循环仍然及时响应。
+分子缓存、数据库连接池、插件目录、SMARTS 的计数是进程内的，子进程的计数随任务结果捎带回父进程
+(每个子进程至多每 WORKER_STATS_INTERVAL 秒一次)，父进程按 pid 保留最新一份并汇总。
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import app.utils.config as config
+from app.utils.logger import logger
+
+
+def _init_worker():
+    """子进程预热：插件注册、字体/绘图选项、干扰层库、分子目录"""
+    from app.captcha.plugins import PLUGINS
+    from app.captcha.utils import get_draw_options
+    from app.utils.catalog import load_catalogs
+    from app.utils.noise import load_noise_libraries
+
+    get_draw_options()
+    load_noise_libraries(config.POOL_SIZES)
+    load_catalogs([plugin.table_name for plugin in PLUGINS.values()])
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def local_stats() -> dict:
+    """本进程的计数：分子缓存、数据库连接池、插件目录、SMARTS"""
+    from app.captcha.smarts import smarts_registry
+    from app.captcha.utils import mol_cache
+    from app.utils.catalog import catalog_stats
+    from app.utils.database import pool_stats
+
+    return {
+        "mol_cache": mol_cache.stats(),
+        "db": pool_stats(),
+        "catalog": catalog_stats(),
+        "smarts": smarts_registry.stats(),
+    }
+
+
+_last_snapshot = 0.0
+
+
+def _snapshot(force: bool = False) -> Optional[tuple]:
+    """(pid, 时间, local_stats())，距上次不足 WORKER_STATS_INTERVAL 秒返回 None"""
+    global _last_snapshot
+    now = time.time()
+    if not force and now - _last_snapshot < config.WORKER_STATS_INTERVAL:
+        return None
+    _last_snapshot = now
+    return os.getpid(), now, local_stats()
+
+
+def _stats_task() -> tuple:
+    return _snapshot(force=True)
+
+
+def _timed_call(fn: Callable, args: tuple, snapshot: bool = False) -> tuple:
+    """在子进程里执行，顺带返回开始/结束时间 (父进程据此算排队等待) 和本进程计数"""
+    started = time.time()
+    result = fn(*args)
+    finished = time.time()
+    return result, started, finished, _snapshot() if snapshot else None
+
+
+def _merge_sum(entries: List[dict], max_keys: tuple = ()) -> dict:
+    """同构的计数字典逐键相加，max_keys 里的键取最大值"""
+    merged = {}
+    for entry in entries:
+        for key, value in entry.items():
+            if key in max_keys:
+                merged[key] = max(merged.get(key, value), value)
+            elif isinstance(value, (int, float)):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def merge_stats(snapshots: List[dict]) -> dict:
+    """多个进程的 local_stats() 汇总成一份"""
+    from app.captcha.smarts import merge_smarts_stats
+
+    mol_cache = _merge_sum([s["mol_cache"] for s in snapshots])
+    total = mol_cache.get("hits", 0) + mol_cache.get("misses", 0)
+    mol_cache["hit_rate"] = round(mol_cache.get("hits", 0) / total, 4) if total else 0.0
+
+    db = {}
+    for name in {name for s in snapshots for name in s["db"]}:
+        entries = [s["db"][name] for s in snapshots if name in s["db"]]
+        merged = _merge_sum(entries, max_keys=("wait_max_ms",))
+        checkouts = merged.get("checkouts", 0)
+        merged["wait_avg_ms"] = round(sum(e["wait_avg_ms"] * e["checkouts"] for e in entries) / checkouts, 4) \
+            if checkouts else 0.0
+        db[name] = merged
+
+    catalog = {}
+    for name in {name for s in snapshots for name in s["catalog"]}:
+        catalog[name] = _merge_sum([s["catalog"][name] for s in snapshots if name in s["catalog"]],
+                                   max_keys=("rows", "max_id"))
+
+    return {
+        "mol_cache": mol_cache,
+        "db": db,
+        "catalog": catalog,
+        "smarts": merge_smarts_stats([s["smarts"] for s in snapshots]),
+    }
+
+
+class _Samples:
+    """最近 N 个样本 (秒)，输出毫秒分位数"""
+
+    def __init__(self, maxlen: int = 1024):
+        self._values = deque(maxlen=maxlen)
+        self.count = 0
+
+    def add(self, value: float):
+        self._values.append(value)
+        self.count += 1
+
+    def summary(self) -> dict:
+        values = sorted(self._values)
+        if not values:
+            return {"count": self.count, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": self.count,
+            "p50_ms": round(values[len(values) // 2] * 1000, 2),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+
+
+class RenderWorkers:
+    def __init__(self, processes: int):
+        """
+        :param processes: 子进程数，0 表示不用进程池 (在默认线程池里跑，仍然不阻塞事件循环)
+        """
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.queue_wait = _Samples()
+        self.run_time = _Samples()
+        self.failures = 0
+        self._process_stats: Dict[int, tuple] = {}  # pid -> (时间, local_stats())
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        if self._executor is not None or self.processes <= 0:
+            return
+        # spawn：子进程不继承父进程的线程/连接，插件在子进程里重新注册
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        pids = {f.result() for f in [self._executor.submit(_ping) for _ in range(self.processes)]}
+        logger.info(f"Render workers started: {len(pids)} processes")
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _record(self, submitted: float, timed: tuple) -> Any:
+        result, started, finished, snapshot = timed
+        self._store_snapshot(snapshot)
+        self.queue_wait.add(max(started - submitted, 0.0))
+        self.run_time.add(finished - started)
+        return result
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """同步调用方 (如预渲染池的后台线程) 用，返回 concurrent Future"""
+        submitted = time.time()
+        if self._executor is None:
+            future = Future()
+            try:
+                future.set_result(self._record(submitted, _timed_call(fn, args)))
+            except Exception as e:
+                self.failures += 1
+                future.set_exception(e)
+            return future
+
+        inner = self._executor.submit(_timed_call, fn, args, True)
+        outer = Future()
+
+        def _done(f: Future):
+            try:
+                outer.set_result(self._record(submitted, f.result()))
+            except Exception as e:
+                self.failures += 1
+                outer.set_exception(e)
+
+        inner.add_done_callback(_done)
+        return outer
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """async 路由用：在进程池 (或默认线程池) 执行，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        try:
+            timed = await loop.run_in_executor(self._executor, _timed_call, fn, args, self.running)
+        except Exception:
+            self.failures += 1
+            raise
+        return self._record(submitted, timed)
+
+    def _store_snapshot(self, snapshot: Optional[tuple]):
+        if snapshot is not None:
+            pid, taken, stats = snapshot
+            self._process_stats[pid] = (taken, stats)
+
+    async def refresh_stats(self):
+        """向池里投每进程一个统计任务 (不保证逐个落到每个子进程，空闲时基本均匀)，补上最近的计数"""
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        snapshots = await asyncio.gather(
+            *[loop.run_in_executor(self._executor, _stats_task) for _ in range(self.processes)],
+            return_exceptions=True)
+        for snapshot in snapshots:
+            if not isinstance(snapshot, BaseException):
+                self._store_snapshot(snapshot)
+
+    def process_stats(self) -> dict:
+        """
+        进程内计数的汇总：父进程自己的 + 各渲染子进程最近一次上报的
+        processes 给出每个子进程那份计数距今多久 (秒)
+        """
+        now = time.time()
+        items = list(self._process_stats.items())
+        merged = merge_stats([local_stats()] + [stats for _, (_, stats) in items])
+        merged["processes"] = {pid: round(now - taken, 2) for pid, (taken, _) in items}
+        return merged
+
+    def stats(self) -> dict:
+        return {
+            "processes": self.processes if self.running else 0,
+            "failures": self.failures,
+            "queue_wait": self.queue_wait.summary(),
+            "run_time": self.run_time.summary(),
+        }
+
+
+class LoopLagMonitor:
+    """周期性 sleep(interval)，实际醒来时间与预期的差值就是事件循环被阻塞的时长"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = _Samples()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.add(max(loop.time() - expected, 0.0))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return self.lag.summary()
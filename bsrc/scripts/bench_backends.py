@@ -0,0 +1,68 @@
+"""
+绘图后端基准：Cairo (PNG) vs MolDraw2DSVG (SVG)
+对同一批分子现场绘制 (不查预渲染底图)，统计 绘制 + 加噪 + 编码 的耗时与输出体积，
+并确认两个后端的原子坐标 (即答案热区) 完全一致。
+用法: python -m scripts.bench_backends [轮数]
+"""
+import gzip
+import sys
+import time
+from rdkit import Chem
+from app.utils import config
+from app.utils.noise import load_noise_libraries
+from app.captcha.utils import render_mol, finish_img
+
+SAMPLE_SMILES = [
+    "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "C[C@H](N)C(=O)N[C@@H](Cc1ccccc1)C(=O)O",
+    "O=C(O)c1ccccc1OC(C)=O",
+    "C/C=C/C(=O)OCC1=CC=CC=C1",
+    "CC1(C)SC2C(NC(=O)Cc3ccccc3)C(=O)N2C1C(=O)O",
+]
+
+# (后端, 输出格式)
+BACKENDS = [("cairo", config.IMAGE_FORMAT), ("svg", config.IMAGE_FORMAT_SVG)]
+
+
+def bench(mols: list, width: int, height: int, rounds: int):
+    print(f"{width}x{height}, {len(mols)} molecules x {rounds} rounds")
+    print(f"{'backend':<10}{'generate ms':>14}{'avg bytes':>12}{'gzip bytes':>12}")
+
+    coords = {}
+    for backend, fmt in BACKENDS:
+        finish_img(render_mol(mols[0], width, height, backend=backend), fmt)
+
+        sizes, gz_sizes = [], []
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for mol in mols:
+                render = render_mol(mol, width, height, backend=backend)
+                data = finish_img(render, fmt)
+                sizes.append(len(data))
+                coords.setdefault(backend, []).append(render.atom_coords)
+        cost = (time.perf_counter() - start) / len(sizes) * 1000
+
+        gz_sizes = [len(gzip.compress(finish_img(render_mol(mol, width, height, backend=backend), fmt)))
+                    for mol in mols]
+        print(f"{backend:<10}{cost:>14.2f}{sum(sizes) / len(sizes):>12.0f}{sum(gz_sizes) / len(gz_sizes):>12.0f}")
+
+    identical = coords["cairo"] == coords["svg"]
+    print(f"hotspot coords identical: {identical}\n")
+    return identical
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    load_noise_libraries(config.POOL_SIZES)
+    mols = [Chem.MolFromSmiles(smiles) for smiles in SAMPLE_SMILES]
+
+    ok = True
+    for width, height in [(config.DEFAULT_WIDTH, config.DEFAULT_HEIGHT), (640, 480)]:
+        ok = bench(mols, width, height, rounds) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
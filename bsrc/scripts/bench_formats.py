@@ -0,0 +1,57 @@
+"""
+输出格式基准：在 DEFAULT_WIDTH x DEFAULT_HEIGHT 下，对同一批加噪后的验证码图片
+统计各格式的编码耗时与体积，用来在带宽和 CPU 之间取舍 (config.IMAGE_FORMAT)
+用法: python -m scripts.bench_formats [分子数]
+"""
+import io
+import sys
+import time
+import numpy as np
+from PIL import Image
+from rdkit import Chem
+from app.utils import config
+from app.utils.encoder import IMAGE_FORMATS, encode_image
+from app.utils.noise import NoiseUtils, load_noise_libraries
+from app.captcha.utils import render_mol
+
+SAMPLE_SMILES = [
+    "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "C[C@H](N)C(=O)N[C@@H](Cc1ccccc1)C(=O)O",
+    "O=C(O)c1ccccc1OC(C)=O",
+    "C/C=C/C(=O)OCC1=CC=CC=C1",
+    "CC1(C)SC2C(NC(=O)Cc3ccccc3)C(=O)N2C1C(=O)O",
+]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else len(SAMPLE_SMILES)
+    width, height = config.DEFAULT_WIDTH, config.DEFAULT_HEIGHT
+    load_noise_libraries([(width, height)])
+
+    images = []
+    for i in range(count):
+        mol = Chem.MolFromSmiles(SAMPLE_SMILES[i % len(SAMPLE_SMILES)])
+        pixels = np.array(Image.open(io.BytesIO(render_mol(mol, width, height).image)).convert("RGBA"))
+        NoiseUtils.add_interference_array(pixels, density=3)
+        images.append(Image.fromarray(pixels, "RGBA"))
+
+    print(f"{width}x{height}, {len(images)} noisy captchas\n")
+    print(f"{'format':<16}{'encode ms':>12}{'avg bytes':>12}{'vs png':>10}")
+
+    baseline = None
+    for fmt in IMAGE_FORMATS:
+        if fmt == config.IMAGE_FORMAT_SVG:  # 矢量格式不从像素编码，见 scripts/bench_backends.py
+            continue
+        encode_image(images[0], fmt)
+        start = time.perf_counter()
+        sizes = [len(encode_image(image, fmt)) for image in images]
+        cost = (time.perf_counter() - start) / len(images) * 1000
+        avg = sum(sizes) / len(sizes)
+        if baseline is None:
+            baseline = avg
+        print(f"{fmt:<16}{cost:>12.2f}{avg:>12.0f}{avg / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+干扰层基准：旧的逐点 ImageDraw 实现 vs NumPy 现算 vs 预计算库合成
+只比较加噪本身 (不含 PNG 编解码)，另附一次完整 add_interference 的耗时
+用法: python -m scripts.bench_noise [次数]
+"""
+import io
+import random
+import sys
+import time
+import numpy as np
+from PIL import Image, ImageDraw
+from rdkit import Chem
+from app.utils import config
+from app.utils.noise import NoiseUtils, NoiseLibrary, load_noise_libraries, get_noise_library, _noise_pixels
+from app.captcha.utils import render_mol
+
+DENSITY = 3
+SAMPLE_SMILES = "CC(C)Cc1ccc(cc1)C(C)C(=O)O"
+
+
+def imagedraw_interference(image: Image.Image, density: int):
+    """旧实现：ImageDraw 逐条画线、逐个画点"""
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+
+    for _ in range(density * 3):
+        x1, y1 = random.randint(0, width), random.randint(0, height)
+        x2, y2 = random.randint(0, width), random.randint(0, height)
+        fill_color = (random.randint(0, 100), random.randint(0, 100), random.randint(0, 100), 200)
+        draw.line([(x1, y1), (x2, y2)], fill=fill_color, width=random.randint(1, 2))
+
+    for _ in range(density * 50):
+        x, y = random.randint(0, width), random.randint(0, height)
+        fill_color = (random.randint(0, 150), random.randint(0, 150), random.randint(0, 150), 255)
+        draw.point((x, y), fill=fill_color)
+
+
+def bench(name: str, fn, rounds: int):
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    cost = (time.perf_counter() - start) / rounds * 1000
+    print(f"{name:<28}{cost:>10.3f} ms")
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    width, height = config.DEFAULT_WIDTH, config.DEFAULT_HEIGHT
+
+    png = render_mol(Chem.MolFromSmiles(SAMPLE_SMILES), width, height).image
+    base = np.array(Image.open(io.BytesIO(png)).convert("RGBA"))
+
+    start = time.perf_counter()
+    library = NoiseLibrary.build(width, height, DENSITY, config.NOISE_LIBRARY_SIZE,
+                                 config.NOISE_LIBRARY_MAX_MB * 1024 * 1024)
+    print(f"library build: {len(library)} layers, {library.nbytes / 1024 / 1024:.1f} MB, "
+          f"{time.perf_counter() - start:.2f}s")
+    print(f"{width}x{height}, density={DENSITY}, {rounds} rounds\n")
+
+    def run_imagedraw():
+        imagedraw_interference(Image.fromarray(base.copy(), "RGBA"), DENSITY)
+
+    def run_numpy():
+        pixels = base.copy()
+        xs, ys, colors = _noise_pixels(width, height, DENSITY)
+        pixels[ys, xs] = colors
+
+    def run_library():
+        library.apply(base.copy())
+
+    def run_copy():
+        base.copy()
+
+    bench("buffer copy (baseline)", run_copy, rounds)
+    bench("ImageDraw per-pixel", run_imagedraw, rounds)
+    bench("NumPy fresh", run_numpy, rounds)
+    bench("overlay library", run_library, rounds)
+
+    load_noise_libraries([(width, height)], density=DENSITY)
+    if get_noise_library(width, height, DENSITY) is not None:
+        bench("add_interference (PNG io)", lambda: NoiseUtils.add_interference(png, density=DENSITY), rounds // 4 or 1)
+
+
+if __name__ == "__main__":
+    main()
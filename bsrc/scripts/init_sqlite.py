@@ -1,5 +1,9 @@
+import multiprocessing
 import os
+import sys
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from rdkit import Chem
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
@@ -7,10 +11,17 @@ from rich.live import Live
 from rich.panel import Panel
 from rich.table import Table
 from rich.layout import Layout
+from rich.markup import escape
 from app.captcha.plugins import PLUGINS
-from app.utils.database import insert_mol_database, exec_sql
-from app.utils.config import MOL_DIR
+from app.utils.database import BatchWriter, exec_sql, enable_wal, ensure_column
+from app.utils.config import MOL_DIR, MOL_PACK_PATH, PRERENDER_AT_INGEST, INGEST_WORKERS, INGEST_CHUNK_SIZE, \
+    INGEST_BULK_LOAD
+from app.utils.pack import PackWriter
+from app.captcha.utils import prepare_depiction, mol_pack_key
+from app.captcha.smarts import smarts_registry, merge_smarts_stats
+from app.captcha.features import MolFeatures
 from app.utils.logger import logger
+from scripts.prerender import prerender_runner
 
 TIMEOUT_SECONDS = 3.0
 
@@ -29,11 +40,13 @@ def init_tables(plugins):
     初始化所有插件的数据库表
     """
     console.print("[bold cyan]🛠️  Initializing Database Tables...[/]")
+    enable_wal()  # 服务端只读连接与入库脚本可同时运行
     for plugin in plugins:
         try:
             sql = plugin.get_table_schema()
             if sql:
                 exec_sql(sql)
+                ensure_column(plugin.table_name, "answer_json", "TEXT")  # 旧库补上预计算答案列
                 console.print(f"   ✅ Table checked/created for plugin: [green]{plugin.slug}[/]")
         except Exception as e:
             console.print(f"   ❌ Failed to init table for {plugin.slug}: {e}")
@@ -69,9 +82,94 @@ def find_next_available_index(mol_dir, current_index):
         return None
 
 
-def classify_runner(mol_dir=MOL_DIR):
+def smarts_table(stats: dict = None):
+    """入库期间各 SMARTS 的匹配次数 (直接匹配 / FilterCatalog 预筛) 与耗时，按累计耗时排序"""
+    table = Table(title="🔍 SMARTS Stats")
+    table.add_column("SMARTS", style="cyan")
+    table.add_column("Plugins", style="magenta")
+    table.add_column("Calls", justify="right")
+    table.add_column("Hits", justify="right", style="green")
+    table.add_column("Prefilter", justify="right")
+    table.add_column("PF hits", justify="right", style="green")
+    table.add_column("Total ms", justify="right")
+    table.add_column("Avg µs", justify="right")
+    stats = smarts_registry.stats() if stats is None else stats
+    for smarts, entry in sorted(stats.items(), key=lambda item: -item[1]["total_ms"]):
+        table.add_row(escape(smarts), ",".join(entry["owners"]), str(entry["calls"]), str(entry["hits"]),
+                      str(entry["prefilter_calls"]), str(entry["prefilter_hits"]),
+                      f"{entry['total_ms']:.1f}", f"{entry['avg_us']:.1f}")
+    return table
 
-    plugins = [cls(10, 10, runtime = False) for cls in PLUGINS.values()]    #  只是扫描，参数随意注册！！！  # 显式传参
+
+_plugins = None
+
+
+def _get_plugins() -> list:
+    global _plugins
+    if _plugins is None:
+        _plugins = [cls(10, 10, runtime = False) for cls in PLUGINS.values()]    #  只是扫描，参数随意注册！！！  # 显式传参
+    return _plugins
+
+
+def classify_file(filename: str, file_path: str) -> dict:
+    """
+    单个分子：解析 -> 所有插件分类 -> 定 2D 排版 -> ToBinary
+    串行路径和子进程共用，返回值可 pickle，由唯一的写者落盘
+    """
+    result = {"filename": filename, "path": file_path, "mol": None, "rows": [], "timings": {}, "relaid_out": False, "errors": []}
+    try:
+        mol = Chem.MolFromMolFile(file_path)
+
+        if not mol:
+            time.sleep(0.01)
+            mol = Chem.MolFromMolFile(file_path)
+
+        if not mol:
+            return result
+
+        try:
+            Chem.SanitizeMol(mol)
+        except Exception as e:
+            logger.warning(f"[error] error file fmt:{e}")
+
+        # 公共特征每个分子只算一次，所有插件共享 (耗时计在第一个用到它的插件上)
+        features = MolFeatures(mol)
+        for plugin in _get_plugins():
+            try:
+                plugin_start = time.perf_counter()
+                metadata = plugin.get_metadata(mol, features)
+                result["timings"][plugin.slug] = time.perf_counter() - plugin_start
+                if metadata:
+                    row_data = {
+                        "filename": filename,
+                        "path": file_path,
+                        **metadata
+                    }
+                    result["rows"].append((plugin.slug, plugin.table_name, row_data))
+            except Exception as e:
+                result["errors"].append(f"Plugin error ({plugin.slug}) on {filename}: {e}")
+
+        if result["rows"]:
+            # 2D 排版在这里定死，随 ToBinary 的构象一起存进打包文件，出图时不再排版
+            result["relaid_out"] = prepare_depiction(mol)
+            result["mol"] = mol.ToBinary()
+
+    except Exception as e:
+        result["errors"].append(f"System error on {filename}: {e}")
+    return result
+
+
+def classify_chunk(items: list) -> tuple:
+    """一批 (filename, path)，返回 (结果列表, 本进程 pid, 本进程 SMARTS 计数)"""
+    return [classify_file(filename, file_path) for filename, file_path in items], os.getpid(), smarts_registry.stats()
+
+
+def classify_runner(mol_dir=MOL_DIR, workers: int = INGEST_WORKERS, chunk_size: int = INGEST_CHUNK_SIZE):
+    """
+    :param workers: 分类子进程数，0 为在当前进程串行执行 (结果完全一致)
+    :param chunk_size: 每批分子数，一批一个事务
+    """
+    plugins = _get_plugins()
     if not plugins:
         console.print("[bold red]❌ No plugins found![/]")
         return
@@ -86,8 +184,12 @@ def classify_runner(mol_dir=MOL_DIR):
     )
 
     stats = {p.slug: 0 for p in plugins}
+    timings = {p.slug: 0.0 for p in plugins}  # 各插件 get_metadata 累计耗时 (秒)
+    smarts_stats = {}  # pid -> 该进程的 SMARTS 计数
     total_processed = 0
+    relaid_out = 0
     current_index = 1
+    start_time = last_write_time = time.time()
 
     job_progress = Progress(
         "{task.description}",
@@ -95,105 +197,154 @@ def classify_runner(mol_dir=MOL_DIR):
         BarColumn(),
         TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
         TextColumn("• Processed: {task.completed}"),
+        TextColumn("• {task.fields[rate]:.1f} mol/s"),
     )
-    task_id = job_progress.add_task("[green]Waiting for stream...", total=None)
+    task_id = job_progress.add_task("[green]Waiting for stream...", total=None, rate=0.0)
 
     def generate_table():
         table = Table(title="📊 Real-time Stats")
         table.add_column("Plugin", style="cyan")
         table.add_column("Table", style="magenta")
         table.add_column("Count", justify="right", style="green")
+        table.add_column("Time ms", justify="right")
+        table.add_column("Avg µs", justify="right")
         for p in plugins:
-            table.add_row(p.slug, p.table_name, str(stats[p.slug]))
+            avg = timings[p.slug] / total_processed * 1e6 if total_processed else 0.0
+            table.add_row(p.slug, p.table_name, str(stats[p.slug]), f"{timings[p.slug] * 1000:.1f}", f"{avg:.1f}")
         return table
 
-    layout["header"].update(Panel("🧪 [bold blue]Mol Classifier[/] (Initializing...)", style="white"))
+    mode = f"{workers} processes" if workers > 0 else "serial"
+    layout["header"].update(Panel(f"🧪 [bold blue]Mol Classifier[/] (Initializing, {mode}...)", style="white"))
     layout["main"].update(generate_table())
     layout["footer"].update(Panel(job_progress))
 
     count = count_files_fast(mol_dir)
 
-    with Live(layout, refresh_per_second=4, console=console):
-        last_found_time = time.time()
-
-        while True:
-            filename = f"{current_index}.mol"
-            file_path = os.path.join(mol_dir, filename)
-
-            if current_index % 1000 == 0:
-                count = count_files_fast(mol_dir)
-
-            if os.path.exists(file_path):
-                last_found_time = time.time()
-
-                try:
-                    mol = Chem.MolFromMolFile(file_path)
-
-                    if not mol:
-                        time.sleep(0.01)
-                        mol = Chem.MolFromMolFile(file_path)
-
-                    if mol:
-                        try:
-                            Chem.SanitizeMol(mol)
-                        except Exception as e:
-
-                            logger.warning(f"[error] error file fmt:{e}")
-                            pass
-
-                        for plugin in plugins:
-                            try:
-                                metadata = plugin.get_metadata(mol)
-                                if metadata:
-                                    row_data = {
-                                        "filename": filename,
-                                        "path": file_path,
-                                        **metadata
-                                    }
-                                    insert_mol_database(plugin.table_name, row_data)
-                                    stats[plugin.slug] += 1
-                            except Exception as e:
-                                console.print(f"[red]Plugin error ({plugin.slug}) on {filename}: {e}[/]")
-
-                    total_processed += 1
-                    current_index += 1
+    executor = None
+    if workers > 0:
+        # spawn：子进程重新注册插件、编译 SMARTS，不继承父进程的连接
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_get_plugins)
+    pending = deque()  # 按提交顺序排队的批次，写入顺序与串行完全一致
+    chunk = []
+
+    mol_pack = PackWriter(MOL_PACK_PATH)
+    writer = BatchWriter(bulk=INGEST_BULK_LOAD)  # 退出时重建索引并 ANALYZE
+
+    def write_chunk(chunk_result: tuple):
+        nonlocal total_processed, relaid_out, last_write_time
+        results, pid, process_smarts = chunk_result
+        smarts_stats[pid] = process_smarts
+
+        rows = []
+        for result in results:
+            for message in result["errors"]:
+                console.print(f"[red]{message}[/]")
+            for slug, elapsed in result["timings"].items():
+                timings[slug] += elapsed
+            if result["mol"] is not None:
+                # 先写打包文件再入库：服务端查到的行，打包里一定已经有分子
+                mol_pack.add(mol_pack_key(result["path"]), result["mol"])
+                relaid_out += result["relaid_out"]
+                for slug, table_name, row_data in result["rows"]:
+                    rows.append((table_name, row_data))
+                    stats[slug] += 1
+        mol_pack.flush()
+        writer.write(rows)
+
+        total_processed += len(results)
+        last_write_time = time.time()
+        rate = total_processed / max(last_write_time - start_time, 1e-6)
+        last = results[-1]["filename"] if results else ""
+        job_progress.update(task_id, completed=total_processed, total=count, rate=rate,
+                            description=f"[green]Processing {last}")
+        layout["main"].update(generate_table())
+
+    def drain(block: bool):
+        while pending and (block or pending[0].done()):
+            write_chunk(pending.popleft().result())
+
+    def submit():
+        nonlocal chunk
+        if not chunk:
+            return
+        if executor is None:
+            write_chunk(classify_chunk(chunk))
+        else:
+            # 在途批次有上限，写者跟不上时先落盘
+            while len(pending) >= workers * 2:
+                write_chunk(pending.popleft().result())
+            pending.append(executor.submit(classify_chunk, chunk))
+        chunk = []
 
-                    job_progress.update(task_id, completed=total_processed,total= count ,description=f"[green]Processing {filename}")
-                    if total_processed % 10 == 0:  # 稍微降低一下刷新频率
-                        layout["main"].update(generate_table())
+    try:
+        with mol_pack, writer, Live(layout, refresh_per_second=4, console=console):
+            last_found_time = time.time()
 
-                except Exception as e:
-                    console.print(f"[red]System error on {filename}: {e}[/]")
-                    current_index += 1
+            while True:
+                filename = f"{current_index}.mol"
+                file_path = os.path.join(mol_dir, filename)
 
-            else:
-                next_index = find_next_available_index(mol_dir, current_index)
+                if current_index % 1000 == 0:
+                    count = count_files_fast(mol_dir)
 
-                if next_index:
+                if os.path.exists(file_path):
+                    last_found_time = time.time()
+                    chunk.append((filename, file_path))
+                    current_index += 1
+                    if len(chunk) >= chunk_size:
+                        submit()
+                    drain(block=False)
 
-                    msg = f"⚠️ Gap detected! Jumping from {current_index} to {next_index}"
-                    # layout["header"].update(Panel(msg, style="yellow"))
-                    logger.debug(msg)
+                else:
+                    next_index = find_next_available_index(mol_dir, current_index)
 
-                    current_index = next_index
-                    last_found_time = time.time()
-                    continue
+                    if next_index:
 
-                elapsed = time.time() - last_found_time
-                layout["header"].update(
-                    Panel(f"Waiting for [yellow]{filename}[/]... (Timeout: {TIMEOUT_SECONDS - elapsed:.1f}s)",
-                          style="white"))
+                        msg = f"⚠️ Gap detected! Jumping from {current_index} to {next_index}"
+                        # layout["header"].update(Panel(msg, style="yellow"))
+                        logger.debug(msg)
 
-                if elapsed > TIMEOUT_SECONDS:
-                    layout["header"].update(
-                        Panel(f"✅ [bold green]Job Finished![/] Processed {total_processed} files.", style="white"))
-                    job_progress.update(task_id, description="[bold red]Done")
-                    break
+                        current_index = next_index
+                        last_found_time = time.time()
+                        continue
 
-                time.sleep(0.2)
+                    # 等新文件时先把手头不满一批的交出去
+                    submit()
+                    drain(block=False)
 
+                    elapsed = time.time() - last_found_time
+                    layout["header"].update(
+                        Panel(f"Waiting for [yellow]{filename}[/]... (Timeout: {TIMEOUT_SECONDS - elapsed:.1f}s)",
+                              style="white"))
+
+                    if elapsed > TIMEOUT_SECONDS:
+                        drain(block=True)
+                        layout["header"].update(
+                            Panel(f"✅ [bold green]Job Finished![/] Processed {total_processed} files.", style="white"))
+                        job_progress.update(task_id, description="[bold red]Done")
+                        break
+
+                    time.sleep(0.2)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = last_write_time - start_time  # 不含最后等待新文件的超时
     console.print("\n[bold]🎉 Final Report:[/]")
     console.print(generate_table())
+    console.print(f"{total_processed} molecules in {elapsed:.1f}s ({total_processed / max(elapsed, 1e-6):.1f} mol/s, {mode})")
+    console.print(f"2D depictions recomputed: {relaid_out}")
+    db_stats = writer.stats()
+    console.print(f"DB writes: {db_stats['rows']} rows in {db_stats['batches']} batches "
+                  f"({db_stats['rows_per_s']:.0f} rows/s, {'bulk' if writer.bulk else 'normal'}), "
+                  f"index rebuild + ANALYZE {db_stats['index_s']:.2f}s")
+    if db_stats["failed_rows"] or db_stats["failed_batches"]:
+        console.print(f"[bold red]DB write errors: {db_stats['failed_rows']} rows lost, "
+                      f"{db_stats['failed_batches']} batches retried row by row[/]")
+        for message in writer.error_samples:
+            console.print(f"   [red]{escape(message)}[/]")
+    console.print(smarts_table(merge_smarts_stats(list(smarts_stats.values()))))
 
 
 if __name__ == "__main__":
@@ -201,4 +352,8 @@ if __name__ == "__main__":
         os.makedirs(MOL_DIR, exist_ok=True)
         console.print(f"[yellow]Created directory {MOL_DIR}[/]")
 
-    classify_runner()
\ No newline at end of file
+    # 用法: python -m scripts.init_sqlite [子进程数]   (0 为串行)
+    classify_runner(workers=int(sys.argv[1]) if len(sys.argv) > 1 else INGEST_WORKERS)
+
+    if PRERENDER_AT_INGEST:
+        prerender_runner()
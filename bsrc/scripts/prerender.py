@@ -0,0 +1,84 @@
+"""
+预渲染底图 (入库的可选后续步骤，init_sqlite 分类完成后执行)：
+对分子打包文件里的每个分子，在每个标准画布尺寸、每个绘图后端 (PRERENDER_BACKENDS) 上绘制一次，
+按内容寻址写入 BASE_PACK_PATH：
+- 几何：单位画布下的原子坐标 (float32)，每个 (分子, 画布) 一条，答案热区直接由它算出
+- 底图：干净的 PNG/SVG，每个 (分子, 画布, 后端) 一条
+出图时只剩 查表 + 叠加噪声 + 编码，不再经过 RDKit 绘图。
+已存在的 key 直接跳过，可重复执行。
+"""
+import time
+from rdkit import Chem
+from rich.console import Console
+from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn
+from app.captcha.utils import draw_canvas, drawing_bytes, geometry_key, pack_geometry, prerender_key
+from app.utils.config import MOL_PACK_PATH, BASE_PACK_PATH, CANONICAL_SIZES, PRERENDER_BACKENDS
+from app.utils.pack import PackWriter, get_pack_reader
+from app.utils.logger import logger
+
+console = Console()
+
+
+def prerender_runner():
+    mol_pack = get_pack_reader(MOL_PACK_PATH)
+    if mol_pack is None:
+        console.print(f"[yellow]Mol pack not found: {MOL_PACK_PATH}, skip prerender[/]")
+        return
+
+    base_pack = get_pack_reader(BASE_PACK_PATH)
+    existing = set(base_pack.keys()) if base_pack is not None else set()
+
+    keys = list(mol_pack.keys())
+    rendered = skipped = failed = 0
+    start = time.time()
+
+    progress = Progress(
+        "{task.description}",
+        SpinnerColumn(),
+        BarColumn(),
+        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+        TextColumn("• {task.completed}/{task.total}"),
+        TimeRemainingColumn(),
+        console=console,
+    )
+
+    with PackWriter(BASE_PACK_PATH) as writer, progress:
+        task_id = progress.add_task("[green]Prerendering", total=len(keys))
+
+        for name in keys:
+            mol_blob = bytes(mol_pack.get(name))
+            mol = None
+
+            for canvas_width, canvas_height in CANONICAL_SIZES:
+                geom_key = geometry_key(mol_blob, canvas_width, canvas_height)
+                for backend in PRERENDER_BACKENDS:
+                    key = prerender_key(mol_blob, canvas_width, canvas_height, backend)
+                    if key in existing and geom_key in existing:
+                        skipped += 1
+                        continue
+
+                    try:
+                        if mol is None:
+                            mol = Chem.Mol(mol_blob)
+                        d2d, atom_coords = draw_canvas(mol, canvas_width, canvas_height, backend)
+                        if geom_key not in existing:
+                            writer.add(geom_key, pack_geometry(atom_coords, canvas_width, canvas_height))
+                            existing.add(geom_key)
+                        if key not in existing:
+                            writer.add(key, drawing_bytes(d2d))
+                            existing.add(key)
+                        rendered += 1
+                    except Exception as e:
+                        failed += 1
+                        logger.warning(f"Prerender failed on {name} @{canvas_width}x{canvas_height} ({backend}): {e}")
+
+            progress.advance(task_id)
+            if rendered and rendered % 200 == 0:
+                writer.flush()
+
+    console.print(f"[bold green]Prerender done[/]: {rendered} rendered, {skipped} cached, "
+                  f"{failed} failed in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    prerender_runner()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 测试不写 .env：导入 config 前先给定密钥
+os.environ.setdefault("AES_KEY", "0123456789abcdef")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
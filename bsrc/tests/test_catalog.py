@@ -0,0 +1,86 @@
+import json
+import sqlite3
+import numpy as np
+import pytest
+from app.utils.catalog import MolCatalog
+from app.utils.exceptions import DataBaseException
+
+
+def _insert(conn, rows):
+    conn.executemany("INSERT INTO carbon_chain (filename, path, answer_json, carbon_count) VALUES (?, ?, ?, ?)",
+                     [(f"{p}.mol", p, json.dumps({"n": n}), n) for p, n in rows])
+    conn.commit()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "mol.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE carbon_chain (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT, path TEXT, answer_json TEXT,
+            carbon_count INTEGER, processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""")
+    _insert(conn, [(f"m{i}", i) for i in range(10)])
+    yield db_path, conn
+    conn.close()
+
+
+def test_filter_and_sample(db):
+    db_path, _ = db
+    catalog = MolCatalog("carbon_chain", refresh_interval=3600, db_path=db_path)
+    assert len(catalog) == 10
+    assert set(catalog._snapshot.columns) == {"carbon_count"}
+
+    indices = catalog.filter(carbon_count=(3, 5))
+    assert sorted(catalog._snapshot.columns["carbon_count"][indices]) == [3, 4, 5]
+    assert len(catalog.filter(carbon_count=(8, None))) == 2
+
+    seen = set()
+    for _ in range(200):
+        row = catalog.sample(indices)
+        assert 3 <= row["carbon_count"] <= 5
+        assert json.loads(row["answer_json"]) == {"n": row["carbon_count"]}  # 文本列按主键现取
+        seen.add(row["carbon_count"])
+    assert seen == {3, 4, 5}
+
+    assert catalog.sample(np.empty(0, dtype=np.int64)) is None
+    with pytest.raises(DataBaseException):
+        catalog.filter(answer_json=(0, 1))
+
+
+def test_get_by_path(db):
+    db_path, conn = db
+    catalog = MolCatalog("carbon_chain", refresh_interval=3600, db_path=db_path)
+    assert catalog.get_by_path("m7")["carbon_count"] == 7
+    assert catalog.get_by_path("missing") is None
+
+    _insert(conn, [("m7", 70)])  # 同一 path 取最后入库的
+    catalog.refresh()
+    assert catalog.get_by_path("m7")["carbon_count"] == 70
+
+
+def test_refresh_detects_changes(db):
+    db_path, conn = db
+    catalog = MolCatalog("carbon_chain", refresh_interval=3600, db_path=db_path)
+    assert len(catalog) == 10
+
+    catalog.refresh()  # data_version 没变
+    assert catalog.reloads == 1 and catalog.increments == 0
+
+    _insert(conn, [("m10", 10), ("m11", 11)])
+    catalog.refresh()
+    assert len(catalog) == 12 and catalog.increments == 1 and catalog.reloads == 1
+
+    conn.execute("UPDATE carbon_chain SET carbon_count = 100 WHERE path = 'm2'")
+    conn.commit()
+    catalog.refresh()
+    assert catalog.reloads == 2
+    assert len(catalog.filter(carbon_count=(100, 100))) == 1
+
+    conn.execute("DELETE FROM carbon_chain WHERE path = 'm0'")
+    conn.commit()
+    catalog.refresh()
+    assert catalog.reloads == 3 and len(catalog) == 11
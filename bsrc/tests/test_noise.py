@@ -0,0 +1,42 @@
+import numpy as np
+import app.utils.noise as noise
+from app.utils.noise import NoiseLibrary, NoiseUtils
+
+
+class _FixedRng:
+    """不翻转、不平移、只取第 0 层"""
+    def random(self):
+        return 1.0
+
+    def integers(self, *args, **kwargs):
+        return 0
+
+
+def _canvas(width, height):
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    pixels[: height // 2, :, 3] = 0  # 一半透明背景，一半半透明的"分子"
+    return pixels
+
+
+def test_library_and_on_the_fly_paint_the_same(monkeypatch):
+    width, height, density = 64, 48, 2
+    layer = noise._noise_pixels(width, height, density)
+    xs, ys, colors = layer
+    # 同一像素多次写入：后写覆盖先写
+    xs, ys = np.concatenate([xs, xs[:5]]), np.concatenate([ys, ys[:5]])
+    colors = np.concatenate([colors, np.full((5, 4), 7, dtype=np.uint8)])
+
+    library = NoiseLibrary(width, height, density, (ys * width + xs).astype(np.int32), colors,
+                           np.asarray([0, xs.size], dtype=np.int64))
+    monkeypatch.setattr(noise, "_rng", _FixedRng())
+    from_library = _canvas(width, height)
+    library.apply(from_library, jitter=0)
+
+    monkeypatch.setattr(noise, "_noise_pixels", lambda w, h, d: (xs, ys, colors))
+    monkeypatch.setattr(noise, "_libraries", {})
+    on_the_fly = _canvas(width, height)
+    NoiseUtils.add_interference_array(on_the_fly, density=density)
+
+    np.testing.assert_array_equal(from_library, on_the_fly)
+    assert (on_the_fly[ys[-5:], xs[-5:]] == 7).all()
@@ -193,7 +193,7 @@ export default function CaptchaCanvas({ slug }: Props) {
                 {!loading && data && (
                     <>
                         <img
-                            src={`data:image/png;base64,${data.img_base64}`}
+                            src={`data:${data.media_type ?? 'image/png'};base64,${data.img_base64}`}
                             className={styles.captchaImg}
                             onClick={handleBgClick}
                             alt="captcha"